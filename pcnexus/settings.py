@@ -31,6 +31,9 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'store.middleware.RateLimitMiddleware',
+    'store.middleware.CookieCartMiddleware',
+    'store.middleware.AnonymousPageCacheMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -45,7 +48,6 @@ TEMPLATES = [
             os.path.join(BASE_DIR, 'pcnexus', 'templates'),  # Add this line
             os.path.join(BASE_DIR, 'templates'),  # Keep this too
         ],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -54,6 +56,14 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'store.context_processors.store_context',
             ],
+            # Compile each template once per process; in development the
+            # autoreloader clears the cache when a template file changes
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -66,6 +76,7 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 60,  # Reuse connections opened by async view workers
     }
 }
 
@@ -81,6 +92,20 @@ DATABASES = {
 #     }
 # }
 
+# Cache (use Redis or Memcached in production so workers share entries)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pcnexus',
+    },
+    # Rate limit buckets: many small, short-lived writes kept apart from
+    # page and fragment caches so they never evict each other
+    'ratelimit': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pcnexus-ratelimit',
+    },
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -126,8 +151,44 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = 'your-email@gmail.com'
 EMAIL_HOST_PASSWORD = 'your-password'
 DEFAULT_FROM_EMAIL = 'PC Nexus Bangladesh <noreply@pcnexus.com.bd>'
+STORE_BASE_URL = 'https://pcnexus.com.bd'  # For links in emails
+
+# Queued emails (store.OutboxEmail) sent by the send_outbox command
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_RETRY_DELAY = 60  # Seconds before the first retry; doubles on each failure
+OUTBOX_MAX_RETRY_DELAY = 60 * 60
 
 # Custom settings for Bangladesh e-commerce
 BD_CURRENCY_SYMBOL = '৳'
 BD_VAT_PERCENTAGE = 15  # VAT percentage in Bangladesh
-DEFAULT_SHIPPING_COST = 120  # Default shipping cost in BDT
\ No newline at end of file
+DEFAULT_SHIPPING_COST = 120  # Default shipping cost in BDT
+
+# Exchange rates (BDT per unit) used until a rate is entered in the admin
+EXCHANGE_RATE_FALLBACKS = {'USD': 110}
+EXCHANGE_RATE_CACHE_TTL = 300  # Seconds each process keeps a rate
+STORE_SECONDARY_CURRENCY = 'USD'  # Converted price shown next to BDT
+
+# Catalog pages served to anonymous visitors from the page cache
+STORE_PAGE_CACHE_VIEWS = [
+    'home', 'product_list', 'product_detail', 'category_list',
+    'category_detail', 'deals', 'laptops', 'peripherals',
+]
+STORE_PAGE_CACHE_TIMEOUT = 300  # Seconds
+
+# Token bucket rate limits by view: (requests per session, requests per IP
+# address, per seconds[, HTTP methods limited, all if left out]). The IP
+# allowance is larger since mobile carriers put many customers behind one
+# address. Showing the login form is not limited, only submitting it.
+STORE_RATE_LIMITS = {
+    'store.views.add_to_cart': (20, 120, 60, ['POST']),
+    'store.api.cart_add': (20, 120, 60, ['POST']),
+    'store.views.user_login': (10, 30, 60, ['POST']),
+    'store.views.product_search': (30, 300, 60),
+}
+STORE_RATE_LIMIT_CACHE = 'ratelimit'
+STORE_RATE_LIMIT_IP_HEADER = 'REMOTE_ADDR'  # e.g. 'HTTP_X_FORWARDED_FOR' behind a trusted proxy
+
+# Anonymous carts are kept in a signed cookie until login
+STORE_CART_COOKIE_NAME = 'cart'
+STORE_CART_COOKIE_AGE = 60 * 60 * 24 * 30  # Seconds
+STORE_CART_MAX_LINES = 50  # Keeps the cookie well under 4 KB
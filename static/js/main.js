@@ -0,0 +1,40 @@
+// Pages served from the anonymous page cache are rendered without the
+// visitor's cart count, messages or CSRF token; fetch them separately.
+document.addEventListener('DOMContentLoaded', function () {
+    if (document.body.dataset.pageCached !== 'true') {
+        return;
+    }
+
+    let url = '/fragments/';
+    const viewed = document.querySelector('[data-viewed-product]');
+    if (viewed) {
+        url += '?viewed=' + encodeURIComponent(viewed.dataset.viewedProduct);
+    }
+
+    fetch(url, { credentials: 'same-origin', headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+        .then(response => response.json())
+        .then(data => {
+            document.querySelectorAll('[data-fragment]').forEach(element => {
+                const value = data[element.dataset.fragment];
+                if (value !== undefined) {
+                    element.textContent = value;
+                }
+            });
+
+            document.querySelectorAll('input[name="csrfmiddlewaretoken"]').forEach(input => {
+                input.value = data.csrf_token;
+            });
+
+            const container = document.getElementById('page-messages');
+            if (container) {
+                data.messages.forEach(message => {
+                    const alert = document.createElement('div');
+                    alert.className = 'alert alert-' + message.tags;
+                    alert.style.cssText = 'background: ' + (message.tags === 'success' ? '#28a745' : '#dc3545') +
+                        '; color: white; padding: 1rem; margin: 1rem 0; border-radius: var(--border-radius);';
+                    alert.textContent = message.message;
+                    container.appendChild(alert);
+                });
+            }
+        });
+});
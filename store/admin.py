@@ -1,15 +1,22 @@
 from django.contrib import admin
 from .models import (
     Category, Product, ProductReview, Cart, CartItem,
-    Order, OrderItem, Wishlist, BangladeshLocation
+    Order, OrderItem, Wishlist, BangladeshLocation, ExchangeRate,
+    Sale, SaleItem, OutboxEmail, SearchTerm
 )
 
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug', 'product_count', 'in_stock_count', 'min_price', 'max_price']
+    search_fields = ['name']
+    prepopulated_fields = {'slug': ('name',)}
+    readonly_fields = ['product_count', 'in_stock_count', 'min_price', 'max_price']
+
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'price_bdt', 'stock_quantity', 'is_available', 'is_featured']
+    list_display = ['name', 'category', 'price_bdt', 'effective_price', 'stock_quantity', 'is_available', 'is_featured']
     list_filter = ['category', 'is_available', 'is_featured', 'brand']
     search_fields = ['name', 'brand', 'model']
     prepopulated_fields = {'slug': ('name',)}
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['effective_price', 'created_at', 'updated_at']
 
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['order_number', 'customer_name', 'total', 'status', 'payment_method', 'created_at']
@@ -22,7 +29,41 @@ class BangladeshLocationAdmin(admin.ModelAdmin):
     list_filter = ['division']
     search_fields = ['district', 'upazila']
 
-admin.site.register(Category)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ['currency', 'rate', 'effective_from', 'created_at']
+    list_filter = ['currency']
+
+class SaleItemInline(admin.TabularInline):
+    model = SaleItem
+    raw_id_fields = ['product']
+    extra = 1
+
+class SaleAdmin(admin.ModelAdmin):
+    list_display = ['name', 'starts_at', 'ends_at', 'is_applied']
+    readonly_fields = ['is_applied', 'created_at']
+    inlines = [SaleItemInline]
+
+    def save_related(self, request, form, formsets, change):
+        # Prices of a sale that is already running are updated straight away;
+        # otherwise apply_sales picks the sale up when it starts
+        product_ids = set(form.instance.items.values_list('product_id', flat=True))
+        super().save_related(request, form, formsets, change)
+        if form.instance.is_applied:
+            product_ids |= set(form.instance.items.values_list('product_id', flat=True))
+            Product.objects.filter(pk__in=product_ids).refresh_effective_prices()
+
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'to', 'created_at', 'attempts', 'sent_at', 'send_after']
+    list_filter = ['sent_at']
+    search_fields = ['to', 'subject']
+    readonly_fields = ['created_at', 'sent_at', 'attempts', 'last_error']
+
+class SearchTermAdmin(admin.ModelAdmin):
+    list_display = ['query', 'count', 'last_searched_at']
+    search_fields = ['query']
+    ordering = ['-count']
+
+admin.site.register(Category, CategoryAdmin)
 admin.site.register(Product, ProductAdmin)
 admin.site.register(ProductReview)
 admin.site.register(Cart)
@@ -30,4 +71,8 @@ admin.site.register(CartItem)
 admin.site.register(Order, OrderAdmin)
 admin.site.register(OrderItem)
 admin.site.register(Wishlist)
-admin.site.register(BangladeshLocation, BangladeshLocationAdmin)
\ No newline at end of file
+admin.site.register(BangladeshLocation, BangladeshLocationAdmin)
+admin.site.register(ExchangeRate, ExchangeRateAdmin)
+admin.site.register(Sale, SaleAdmin)
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
+admin.site.register(SearchTerm, SearchTermAdmin)
@@ -0,0 +1,82 @@
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection
+from django.db.models.query import QuerySet
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def _result(query):
+    if isinstance(query, QuerySet):
+        # Fill the result cache but hand the queryset back, so templates
+        # can still call .count() or .exists() on it without a query
+        len(query)
+        return query
+    return query()
+
+
+def _evaluate(query):
+    try:
+        return _result(query)
+    finally:
+        close_old_connections()
+
+
+def _evaluate_in_transaction(queries):
+    """Evaluate queries one by one on this thread's connection if it is in
+    a transaction, whose uncommitted writes other connections cannot see.
+    Returns None outside a transaction."""
+    if not connection.in_atomic_block:
+        return None
+    return {name: _result(query) for name, query in queries.items()}
+
+
+async def gather_queries(**queries):
+    """Evaluate independent querysets (or zero-argument callables) concurrently.
+
+    Django's own async ORM methods all run on the single thread-sensitive
+    executor, so they never overlap. Each query here runs in its own worker
+    thread and therefore on its own database connection; set CONN_MAX_AGE
+    so those connections are reused between requests. Inside a transaction
+    (ATOMIC_REQUESTS, or a test case) they run in turn on its connection.
+    """
+    results = await sync_to_async(_evaluate_in_transaction)(queries)
+    if results is not None:
+        return results
+    names = list(queries)
+    results = await asyncio.gather(*(
+        sync_to_async(_evaluate, thread_sensitive=False)(queries[name])
+        for name in names
+    ))
+    return dict(zip(names, results))
+
+
+def async_condition(validators):
+    """``condition()`` for async views whose validators query the database.
+
+    ``validators(request, *args, **kwargs)`` returns an (etag, last_modified)
+    pair and is run in a thread instead of on the event loop.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            etag, last_modified = await sync_to_async(validators)(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag is not None else None
+            last_modified = int(last_modified.timestamp()) if last_modified else None
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                response = await view(request, *args, **kwargs)
+
+            if request.method in ('GET', 'HEAD'):
+                if last_modified and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+            return response
+        return inner
+    return decorator
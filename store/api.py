@@ -0,0 +1,371 @@
+"""JSON storefront API.
+
+Current endpoints live under /api/v1/; the unversioned /api/ paths the
+templates already call are kept as aliases. Responses are built from
+values() rows rather than model instances.
+"""
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.cache import never_cache
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_GET, require_POST
+
+from .cache import get_version
+from .cart import add_product_to_cart, cart_summary, get_cart, set_cart_quantity
+from .models import Category, Product, StockNotification, Wishlist
+from .ratelimit import rejection_counts
+
+MAX_BATCH_SIZE = 100
+
+# Public field name -> lookup read with values_list()
+PRODUCT_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'slug': 'slug',
+    'brand': 'brand',
+    'model': 'model',
+    'category': 'category__slug',
+    'price': 'effective_price',
+    'regular_price': 'price_bdt',
+    'discount_percentage': 'discount_percentage',
+    'stock': 'stock_quantity',
+    'rating': 'average_rating',
+    'review_count': 'review_count',
+    'warranty': 'warranty',
+    'short_description': 'short_description',
+    'image': 'main_image',
+}
+DEFAULT_PRODUCT_FIELDS = ['id', 'name', 'slug', 'price', 'regular_price', 'stock', 'image']
+
+# Columns of the payload category pages filter and sort in the browser
+CATEGORY_COLUMNS = [
+    'id', 'name', 'slug', 'price', 'regular_price', 'brand', 'stock', 'rating', 'review_count', 'image',
+]
+CATEGORY_COLUMNS_TIMEOUT = 60 * 60 * 24  # Seconds; a new category version replaces it sooner
+
+
+def _error(message, status=400):
+    return JsonResponse({'success': False, 'error': message}, status=status)
+
+
+def _json_body(request):
+    """POST data sent either as a JSON object or as a regular form"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+    return request.POST
+
+
+def _id_list(value):
+    return [int(part) for part in value.split(',') if part.strip().isdigit()]
+
+
+def parse_fields(request, default=DEFAULT_PRODUCT_FIELDS):
+    """Field names from ?fields=a,b,c, or the defaults; ValueError on unknown names"""
+    names = [name.strip() for name in request.GET.get('fields', '').split(',') if name.strip()]
+    unknown = [name for name in names if name not in PRODUCT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return names or list(default)
+
+
+def serialize_products(queryset, fields):
+    """Product dicts holding only the given fields, without instantiating models"""
+    rows = []
+    for values in queryset.values_list(*(PRODUCT_FIELDS[name] for name in fields)):
+        row = dict(zip(fields, values))
+        if 'image' in row:
+            row['image'] = settings.MEDIA_URL + row['image'] if row['image'] else None
+        rows.append(row)
+    return rows
+
+
+# Products
+@require_GET
+def products(request):
+    """Products by ?ids=1,2,3 (in that order), or a page of a ?category= by id"""
+    try:
+        fields = parse_fields(request)
+    except ValueError as exc:
+        return _error(str(exc))
+
+    queryset = Product.objects.filter(is_available=True)
+    if 'ids' in request.GET:
+        ids = _id_list(request.GET['ids'])[:MAX_BATCH_SIZE]
+        rows = serialize_products(queryset.filter(pk__in=ids), ['id'] + fields)
+        by_id = {row['id']: row for row in rows}
+        if 'id' not in fields:
+            for row in rows:
+                del row['id']
+        return JsonResponse({'products': [by_id[pk] for pk in ids if pk in by_id]})
+
+    category = request.GET.get('category')
+    if category:
+        queryset = queryset.filter(category__slug=category)
+    after = request.GET.get('after', '')
+    if after.isdigit():
+        queryset = queryset.filter(pk__gt=after)
+    limit = request.GET.get('limit', '')
+    limit = min(int(limit), MAX_BATCH_SIZE) if limit.isdigit() and int(limit) > 0 else 24
+
+    rows = serialize_products(queryset.order_by('pk')[:limit + 1], ['id'] + fields)
+    next_cursor = rows[limit - 1]['id'] if len(rows) > limit else None
+    rows = rows[:limit]
+    if 'id' not in fields:
+        for row in rows:
+            del row['id']
+    return JsonResponse({'products': rows, 'next': next_cursor})
+
+
+@require_GET
+def product(request, product_id):
+    """One product"""
+    try:
+        fields = parse_fields(request)
+    except ValueError as exc:
+        return _error(str(exc))
+
+    rows = serialize_products(Product.objects.filter(pk=product_id, is_available=True), fields)
+    if not rows:
+        return _error('Product not found.', 404)
+    return JsonResponse({'product': rows[0]})
+
+
+def category_columns(category_id):
+    """JSON text of a category's active products as parallel column arrays.
+
+    Built once per category version and kept in the cache as encoded text,
+    so serving it again costs one cache read and no queries.
+    """
+    version = get_version('category', category_id)
+    key = f'category_columns:{category_id}:{version}'
+    payload = cache.get(key)
+    if payload is None:
+        rows = Product.objects.filter(category_id=category_id, is_active=True).order_by('pk')
+        rows = serialize_products(rows, CATEGORY_COLUMNS)
+        columns = {
+            name: [float(row[name]) if isinstance(row[name], Decimal) else row[name] for row in rows]
+            for name in CATEGORY_COLUMNS
+        }
+        payload = json.dumps(
+            {'version': version, 'count': len(rows), 'columns': columns},
+            separators=(',', ':'),
+        )
+        cache.set(key, payload, CATEGORY_COLUMNS_TIMEOUT)
+    return payload
+
+
+def _category_columns_etag(request, slug):
+    category_id = Category.objects.filter(slug=slug).values_list('pk', flat=True).first()
+    if category_id is None:
+        raise Http404('Category not found.')
+    request._category_id = category_id
+    return f'category-columns-{category_id}-{get_version("category", category_id)}'
+
+
+@require_GET
+@gzip_page
+@condition(etag_func=_category_columns_etag)
+def category_products(request, slug):
+    """Every active product of a category in columnar form, for client-side filtering"""
+    response = HttpResponse(category_columns(request._category_id), content_type='application/json')
+    patch_cache_control(response, public=True, max_age=settings.STORE_PAGE_CACHE_TIMEOUT)
+    return response
+
+
+# Cart
+def _cart_response(cart):
+    return JsonResponse({'success': True, 'cart': cart_summary(cart)})
+
+
+@never_cache
+@require_GET
+def cart(request):
+    """Contents and totals of the visitor's cart"""
+    return _cart_response(get_cart(request))
+
+
+def _cart_request(request, default_quantity):
+    """(product, quantity, error_response) from the request body"""
+    data = _json_body(request)
+    try:
+        product_id = int(data.get('product_id'))
+        quantity = int(data.get('quantity', default_quantity))
+    except (TypeError, ValueError):
+        return None, None, _error('Invalid product or quantity.')
+    if quantity < 0:
+        return None, None, _error('Invalid product or quantity.')
+
+    product = Product.objects.filter(
+        pk=product_id, is_available=True
+    ).only('stock_quantity').first()
+    if product is None:
+        return None, None, _error('Product not found.', 404)
+    if quantity > product.stock_quantity:
+        return None, None, _error(f'Only {product.stock_quantity} items available.')
+    return product, quantity, None
+
+
+@require_POST
+def cart_add(request):
+    """Add a product to the cart"""
+    product, quantity, error = _cart_request(request, default_quantity=1)
+    if error:
+        return error
+    if quantity == 0:
+        return _error('Invalid product or quantity.')
+
+    cart = add_product_to_cart(request, product.pk, quantity)
+    if cart is None:
+        return _error('Your cart is full. Log in to add more products.')
+    return _cart_response(cart)
+
+
+@require_POST
+def cart_update(request):
+    """Set the quantity of a product in the cart (0 removes it)"""
+    product, quantity, error = _cart_request(request, default_quantity=1)
+    if error:
+        return error
+
+    cart = set_cart_quantity(request, product.pk, quantity)
+    if cart is None:
+        return _error('This product is not in your cart.', 404)
+    return _cart_response(cart)
+
+
+@require_POST
+def cart_remove(request):
+    """Remove a product from the cart"""
+    data = _json_body(request)
+    try:
+        product_id = int(data.get('product_id'))
+    except (TypeError, ValueError):
+        return _error('Invalid product.')
+
+    cart = set_cart_quantity(request, product_id, 0)
+    if cart is None:
+        return _error('This product is not in your cart.', 404)
+    return _cart_response(cart)
+
+
+# Wishlist
+def _wishlist_summary(product_ids):
+    return {'count': len(product_ids), 'product_ids': sorted(product_ids)}
+
+
+def _wishlist_api(request, action):
+    if not request.user.is_authenticated:
+        return _error('Please log in to use your wishlist.', 401)
+
+    try:
+        product_id = int(_json_body(request).get('product_id'))
+    except (TypeError, ValueError):
+        return _error('Invalid product.')
+
+    in_wishlist = product_id in Wishlist.get_product_ids(request.user)
+    if action == 'toggle':
+        action = 'remove' if in_wishlist else 'add'
+
+    if action == 'add' and not in_wishlist:
+        if not Product.objects.filter(id=product_id).exists():
+            return _error('Product not found.', 404)
+        wishlist, created = Wishlist.objects.get_or_create(user=request.user)
+        wishlist.products.add(product_id)
+    elif action == 'remove' and in_wishlist:
+        Wishlist.products.through.objects.filter(
+            wishlist__user=request.user, product_id=product_id
+        ).delete()
+        cache.delete(Wishlist.product_ids_cache_key(request.user.pk))
+
+    product_ids = Wishlist.get_product_ids(request.user)
+    return JsonResponse({
+        'success': True,
+        'product_id': product_id,
+        'in_wishlist': action == 'add',
+        'wishlist_count': len(product_ids),
+        'wishlist': _wishlist_summary(product_ids),
+    })
+
+
+@require_POST
+def wishlist_add(request):
+    """Add a product to the wishlist"""
+    return _wishlist_api(request, 'add')
+
+
+@require_POST
+def wishlist_remove(request):
+    """Remove a product from the wishlist"""
+    return _wishlist_api(request, 'remove')
+
+
+@require_POST
+def wishlist_toggle(request):
+    """Add or remove a product depending on whether it is in the wishlist"""
+    return _wishlist_api(request, 'toggle')
+
+
+@never_cache
+def wishlist_membership(request):
+    """Which of the given product ids (?ids=1,2,3) are in the wishlist"""
+    product_ids = Wishlist.get_product_ids(request.user)
+    ids = request.GET.get('ids')
+    if ids:
+        product_ids = product_ids & set(_id_list(ids))
+    return JsonResponse({'product_ids': sorted(product_ids)})
+
+
+# Back-in-stock notifications
+@require_POST
+def request_notification(request):
+    """Subscribe an email address to a product's back-in-stock email"""
+    data = _json_body(request)
+    try:
+        product_id = int(data.get('product_id'))
+    except (TypeError, ValueError):
+        return _error('Invalid product.')
+
+    email = (data.get('email') or '').strip()
+    if not email and request.user.is_authenticated:
+        email = request.user.email
+    try:
+        validate_email(email)
+    except ValidationError:
+        return _error('Please enter a valid email address.')
+
+    product = Product.objects.filter(id=product_id).only('stock_quantity').first()
+    if product is None:
+        return _error('Product not found.', 404)
+    if product.stock_quantity > 0:
+        return _error('This product is in stock.')
+
+    # Subscribing again after an earlier notification waits for the next restock
+    StockNotification.objects.update_or_create(
+        product=product,
+        email=email.lower(),
+        defaults={
+            'notified_at': None,
+            'user': request.user if request.user.is_authenticated else None,
+        },
+    )
+    return JsonResponse({'success': True})
+
+
+# Monitoring
+@never_cache
+@staff_member_required
+def rate_limits(request):
+    """Requests the rate limiter has rejected, per view"""
+    return JsonResponse({'rejected': rejection_counts()})
@@ -0,0 +1,81 @@
+import time
+
+from django.core.cache import cache
+
+
+def _version_key(*parts):
+    return 'version:' + ':'.join(str(part) for part in parts)
+
+
+def get_version(*parts):
+    """Return the current version counter for a cached namespace.
+
+    Counters start from the current time in milliseconds so that an evicted
+    counter never falls back to a value an older cache entry was stored under.
+    """
+    key = _version_key(*parts)
+    version = cache.get(key)
+    if version is None:
+        version = int(time.time() * 1000)
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def bump_version(*parts):
+    """Invalidate everything cached under a namespace by moving its counter"""
+    key = _version_key(*parts)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.set(key, version, None)
+        return version
+
+
+def get_versions(namespaces):
+    """Return the current versions of several namespaces in one cache round-trip"""
+    keys = [_version_key(*parts) for parts in namespaces]
+    found = cache.get_many(keys)
+    return [
+        found[key] if key in found else get_version(*parts)
+        for key, parts in zip(keys, namespaces)
+    ]
+
+
+def bump_product_versions(rows, category_ids=()):
+    """Invalidate products given as (product_id, category_id) pairs, along
+    with any further category_ids.
+
+    Used after bulk updates that bypass the model signals.
+    """
+    categories = set(category_ids)
+    for product_id, category_id in rows:
+        bump_version('product', product_id)
+        categories.add(category_id)
+    for category_id in categories:
+        bump_version('category', category_id)
+    if categories:
+        bump_version('catalog')
+
+
+def get_tracked(key):
+    """Return a value stored by set_tracked(), or None once a namespace it
+    was built from has moved on"""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    dependencies, versions, value = entry
+    if get_versions(dependencies) != versions:
+        return None
+    return value
+
+
+def set_tracked(key, value, dependencies, versions, timeout):
+    """Cache a value along with the namespaces it was built from.
+
+    versions are those of the dependencies, read before the value was built
+    so that a change made meanwhile invalidates it; the timeout bounds the
+    staleness left by anything read before them.
+    """
+    cache.set(key, (list(dependencies), list(versions), value), timeout)
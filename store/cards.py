@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .cache import get_versions
+from .models import ExchangeRate
+
+CARD_TIMEOUT = 60 * 60 * 24  # Seconds; a changed product is keyed anew sooner
+
+# Cards are cached without the visitor's CSRF token; the {% csrf_token %} in a
+# card renders this instead and it is swapped for the real token on output
+CSRF_PLACEHOLDER = 'CARD-CSRF-TOKEN'
+
+
+def _card_key(variant, product, product_version, rate, rates_version, cards_version):
+    updated_at = product.updated_at.timestamp() if product.updated_at else 0
+    return (
+        f'product_card:{variant}:{product.pk}:{updated_at}:{product_version}:'
+        f'{settings.STORE_SECONDARY_CURRENCY}:{rate}:{rates_version}:{cards_version}'
+    )
+
+
+def render_product_cards(products, variant, csrf_token=''):
+    """HTML of the store/cards/<variant>.html card of each product.
+
+    Cards are cached per product, updated_at, product version and currency
+    (with the rate in effect and the exchange rate version, for the converted
+    price, since a scheduled rate takes effect without a save), and a whole
+    page of them is read with one get_many(); only missing cards are rendered.
+    """
+    products = list(products)
+    if not products:
+        return []
+
+    *product_versions, rates_version, cards_version = get_versions(
+        [('product', product.pk) for product in products] + [('exchange_rates',), ('product_cards',)]
+    )
+    rate = ExchangeRate.get_rate(settings.STORE_SECONDARY_CURRENCY)
+    keys = [
+        _card_key(variant, product, version, rate, rates_version, cards_version)
+        for product, version in zip(products, product_versions)
+    ]
+    cards = cache.get_many(keys)
+
+    missing = {}
+    for key, product in zip(keys, products):
+        if key not in cards:
+            missing[key] = render_to_string(f'store/cards/{variant}.html', {
+                'product': product,
+                'secondary_currency': settings.STORE_SECONDARY_CURRENCY,
+                'csrf_token': CSRF_PLACEHOLDER,
+            })
+    if missing:
+        cache.set_many(missing, CARD_TIMEOUT)
+        cards.update(missing)
+
+    return [mark_safe(cards[key].replace(CSRF_PLACEHOLDER, str(csrf_token))) for key in keys]
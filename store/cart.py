@@ -0,0 +1,221 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import F
+
+from .models import Cart, CartItem, Product
+
+COOKIE_SALT = 'store.cart'
+VAT_RATE = Decimal(settings.BD_VAT_PERCENTAGE) / 100
+
+
+class CookieCartItem:
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+
+    @property
+    def id(self):
+        # Cart URLs address the lines of a cookie cart by product id
+        return self.product.pk
+
+    @property
+    def total_price(self):
+        return self.product.current_price * self.quantity
+
+
+class CookieCartItems:
+    """Stand-in for ``cart.items`` so templates work with either kind of cart"""
+
+    def __init__(self, cart):
+        self._cart = cart
+
+    def all(self):
+        return self._cart.lines()
+
+    def count(self):
+        return len(self._cart.quantities)
+
+
+class CookieCart:
+    """Cart of an anonymous visitor, kept in a signed cookie.
+
+    Only product ids and quantities are stored, so counting the items needs
+    no query, and nothing is written to the database until the visitor logs
+    in and the cart is merged into a ``Cart`` row.
+    """
+
+    def __init__(self, quantities=None):
+        self.quantities = dict(quantities or {})
+        self.items = CookieCartItems(self)
+        self.modified = False
+        self._lines = None
+
+    @classmethod
+    def from_request(cls, request):
+        value = request.get_signed_cookie(
+            settings.STORE_CART_COOKIE_NAME,
+            default='',
+            salt=COOKIE_SALT,
+            max_age=settings.STORE_CART_COOKIE_AGE,
+        )
+        return cls(cls.decode(value))
+
+    @staticmethod
+    def decode(value):
+        quantities = {}
+        for line in value.split(','):
+            product_id, _, quantity = line.partition(':')
+            if product_id.isdigit() and quantity.isdigit() and int(quantity) > 0:
+                quantities[int(product_id)] = int(quantity)
+        return quantities
+
+    def encode(self):
+        return ','.join(f'{product_id}:{quantity}' for product_id, quantity in self.quantities.items())
+
+    def __contains__(self, product_id):
+        return product_id in self.quantities
+
+    @property
+    def total_items(self):
+        return sum(self.quantities.values())
+
+    @property
+    def total_price(self):
+        return sum(item.total_price for item in self.lines())
+
+    def lines(self):
+        """Cart lines with their products, fetched in one query"""
+        if self._lines is None:
+            products = Product.objects.select_related('category').in_bulk(list(self.quantities))
+            for product_id in set(self.quantities) - set(products):
+                self.remove(product_id)  # Deleted since it was added
+            self._lines = [
+                CookieCartItem(products[product_id], quantity)
+                for product_id, quantity in self.quantities.items()
+            ]
+        return self._lines
+
+    def add(self, product_id, quantity):
+        """Add to a line; returns False when the cart has no room for a new line"""
+        if product_id not in self.quantities and len(self.quantities) >= settings.STORE_CART_MAX_LINES:
+            return False
+        self.set(product_id, self.quantities.get(product_id, 0) + quantity)
+        return True
+
+    def set(self, product_id, quantity):
+        if quantity > 0:
+            self.quantities[product_id] = quantity
+        else:
+            self.quantities.pop(product_id, None)
+        self.modified = True
+        self._lines = None
+
+    def remove(self, product_id):
+        self.set(product_id, 0)
+
+    def clear(self):
+        self.quantities.clear()
+        self.modified = True
+        self._lines = None
+
+    def save(self, response):
+        if not self.quantities:
+            response.delete_cookie(settings.STORE_CART_COOKIE_NAME)
+            return
+        response.set_signed_cookie(
+            settings.STORE_CART_COOKIE_NAME,
+            self.encode(),
+            salt=COOKIE_SALT,
+            max_age=settings.STORE_CART_COOKIE_AGE,
+            secure=settings.SESSION_COOKIE_SECURE,
+            httponly=True,
+            samesite='Lax',
+        )
+
+
+def get_cookie_cart(request):
+    """The anonymous visitor's cart, read from the cookie once per request"""
+    if not hasattr(request, '_cookie_cart'):
+        cart = CookieCart.from_request(request)
+        # Carts from before cookie carts live in the database; move them over once
+        cart_id = request.session.pop('cart_id', None)
+        if cart_id:
+            legacy = Cart.objects.filter(id=cart_id, user__isnull=True).first()
+            if legacy is not None:
+                for product_id, quantity in legacy.items.values_list('product_id', 'quantity'):
+                    cart.add(product_id, quantity)
+                legacy.delete()
+        request._cookie_cart = cart
+    return request._cookie_cart
+
+
+def get_cart(request):
+    """The user's Cart row, or the anonymous visitor's cookie cart"""
+    if request.user.is_authenticated:
+        cart, created = Cart.objects.get_or_create(user=request.user)
+        return cart
+    return get_cookie_cart(request)
+
+
+def add_product_to_cart(request, product_id, quantity):
+    """Add quantity of a product; returns the cart, or None when a cookie cart is full"""
+    cart = get_cart(request)
+    if isinstance(cart, CookieCart):
+        return cart if cart.add(product_id, quantity) else None
+
+    cart_item, created = CartItem.objects.get_or_create(
+        cart=cart, product_id=product_id, defaults={'quantity': quantity}
+    )
+    if not created:
+        CartItem.objects.filter(pk=cart_item.pk).update(quantity=F('quantity') + quantity)
+    return cart
+
+
+def set_cart_quantity(request, product_id, quantity):
+    """Change a line's quantity (0 removes it); returns the cart, or None if the product is not in it"""
+    cart = get_cart(request)
+    if isinstance(cart, CookieCart):
+        if product_id not in cart:
+            return None
+        cart.set(product_id, quantity)
+        return cart
+
+    lines = CartItem.objects.filter(cart=cart, product_id=product_id)
+    changed = lines.update(quantity=quantity) if quantity > 0 else lines.delete()[0]
+    return cart if changed else None
+
+
+def cart_totals(subtotal):
+    """(shipping_cost, vat, total) for a cart subtotal in BDT"""
+    shipping_cost = settings.DEFAULT_SHIPPING_COST
+    vat = (subtotal + shipping_cost) * VAT_RATE
+    return shipping_cost, vat, subtotal + shipping_cost + vat
+
+
+def cart_summary(cart):
+    """JSON-ready cart contents and totals, read with a single query"""
+    if isinstance(cart, CookieCart):
+        rows = [
+            (product_id, cart.quantities[product_id], price)
+            for product_id, price in Product.objects.filter(
+                pk__in=list(cart.quantities)
+            ).values_list('pk', 'effective_price')
+        ]
+    else:
+        rows = cart.items.values_list('product_id', 'quantity', 'product__effective_price')
+
+    items = [
+        {'product_id': product_id, 'quantity': quantity, 'price': price, 'total': price * quantity}
+        for product_id, quantity, price in rows
+    ]
+    subtotal = sum((item['total'] for item in items), Decimal(0))
+    shipping_cost, vat, total = cart_totals(subtotal)
+    return {
+        'items': items,
+        'total_items': sum(item['quantity'] for item in items),
+        'subtotal': subtotal,
+        'shipping': shipping_cost,
+        'vat': vat.quantize(Decimal('0.01')),
+        'total': total.quantize(Decimal('0.01')),
+    }
@@ -1,48 +1,46 @@
+from django.conf import settings
+
+from .cart import get_cookie_cart
 from .models import Category, Cart, Wishlist
 
+def get_cart_items_count(request):
+    """Number of items in the visitor's cart"""
+    if request.user.is_authenticated:
+        try:
+            cart = Cart.objects.get(user=request.user)
+            return cart.total_items
+        except Cart.DoesNotExist:
+            return 0
+
+    # Anonymous carts live in a cookie, so counting them needs no query
+    return get_cookie_cart(request).total_items
+
+def get_wishlist_count(request):
+    """Number of products in the user's wishlist"""
+    return len(Wishlist.get_product_ids(request.user))
+
 def store_context(request):
     """Context processor for global store data"""
     context = {
         'bd_currency_symbol': '৳',
         'bd_vat_percentage': 15,
         'default_shipping_cost': 120,
+        'secondary_currency': settings.STORE_SECONDARY_CURRENCY,
     }
-    
+
     # Get all categories for navigation
     categories = Category.objects.all()[:8]  # Limit to 8 for navigation
     context['categories'] = categories
-    
-    # Cart item count
-    cart_items_count = 0
-    if request.user.is_authenticated:
-        try:
-            cart = Cart.objects.get(user=request.user)
-            cart_items_count = cart.total_items
-        except Cart.DoesNotExist:
-            cart_items_count = 0
-    else:
-        # For anonymous users, use session
-        cart_id = request.session.get('cart_id')
-        if cart_id:
-            try:
-                cart = Cart.objects.get(id=cart_id)
-                cart_items_count = cart.total_items
-            except Cart.DoesNotExist:
-                cart_items_count = 0
-        else:
-            cart_items_count = 0
-    
-    context['cart_items_count'] = cart_items_count
-    
-    # Wishlist count
-    wishlist_count = 0
-    if request.user.is_authenticated:
-        try:
-            wishlist = Wishlist.objects.get(user=request.user)
-            wishlist_count = wishlist.products.count()
-        except Wishlist.DoesNotExist:
-            wishlist_count = 0
-    
-    context['wishlist_count'] = wishlist_count
-    
-    return context
\ No newline at end of file
+
+    # Pages rendered for the shared page cache leave the per-visitor
+    # fragments empty; main.js fills them in from store:session_fragments
+    if getattr(request, 'page_cached', False):
+        context['page_cached'] = True
+        context['cart_items_count'] = 0
+        context['wishlist_count'] = 0
+        return context
+
+    context['cart_items_count'] = get_cart_items_count(request)
+    context['wishlist_count'] = get_wishlist_count(request)
+
+    return context
@@ -0,0 +1,70 @@
+from collections import Counter, defaultdict
+
+
+def trigrams(word):
+    """Character trigrams of a word, padded so its start and end count more"""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """The words of a set of documents, indexed by trigram for typo-tolerant lookups.
+
+    Built once from (document_id, words) pairs and only read afterwards, so
+    one instance can be shared by all threads of a process.
+    """
+
+    def __init__(self, documents):
+        self._word_ids = {}
+        self._word_sizes = []  # Trigram count of each word
+        self._word_documents = []
+        self._postings = defaultdict(list)  # Trigram -> ids of the words containing it
+        for document_id, words in documents:
+            for word in words:
+                word_id = self._word_ids.get(word)
+                if word_id is None:
+                    word_id = self._word_ids[word] = len(self._word_documents)
+                    grams = trigrams(word)
+                    self._word_sizes.append(len(grams))
+                    self._word_documents.append(set())
+                    for gram in grams:
+                        self._postings[gram].append(word_id)
+                self._word_documents[word_id].add(document_id)
+
+    def __len__(self):
+        return len(self._word_documents)
+
+    def similar_words(self, word, threshold):
+        """{word_id: similarity} of the indexed words at least threshold similar to word.
+
+        Similarity is the Jaccard index of the two trigram sets; only words
+        sharing a trigram with the query are looked at.
+        """
+        grams = trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+
+        similar = {}
+        for word_id, count in shared.items():
+            similarity = count / (len(grams) + self._word_sizes[word_id] - count)
+            if similarity >= threshold:
+                similar[word_id] = similarity
+        return similar
+
+    def search(self, words, threshold=0.3, limit=100):
+        """Document ids ranked by how well their words match the query words.
+
+        A document scores the similarity of its closest word to each query
+        word, summed over the query words.
+        """
+        scores = defaultdict(float)
+        for word in words:
+            best = {}
+            for word_id, similarity in self.similar_words(word, threshold).items():
+                for document_id in self._word_documents[word_id]:
+                    if similarity > best.get(document_id, 0):
+                        best[document_id] = similarity
+            for document_id, similarity in best.items():
+                scores[document_id] += similarity
+        return sorted(scores, key=lambda document_id: (-scores[document_id], document_id))[:limit]
@@ -0,0 +1,67 @@
+import time
+from collections import Counter
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DatabaseSessionStore
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import Cart, CartItem
+
+
+def _delete_in_batches(queryset, batch_size, pause):
+    """Delete the rows matched by queryset in primary key order.
+
+    Each batch is a short transaction of its own, and the filter is applied
+    again when deleting, so rows touched since they were selected survive.
+    Returns deleted row counts per model label, cascades included.
+    """
+    deleted = Counter()
+    last_pk = None
+    while True:
+        batch = queryset.order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        pks = list(batch.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+
+        with transaction.atomic():
+            deleted.update(queryset.filter(pk__in=pks).delete()[1])
+
+        last_pk = pks[-1]
+        if len(pks) < batch_size:
+            break
+        time.sleep(pause)  # Let live traffic get at the table between batches
+    return deleted
+
+
+def purge_expired_sessions(batch_size=1000, pause=0.1):
+    """Delete expired sessions from the session table"""
+    engine = import_module(settings.SESSION_ENGINE)
+    if not issubclass(engine.SessionStore, DatabaseSessionStore):
+        # Cache and cookie sessions expire on their own
+        engine.SessionStore.clear_expired()
+        return Counter()
+
+    Session = engine.SessionStore.get_model_class()
+    return _delete_in_batches(
+        Session.objects.filter(expire_date__lt=timezone.now()), batch_size, pause
+    )
+
+
+def purge_stale_carts(days=30, batch_size=1000, pause=0.1):
+    """Delete carts nobody has touched for the given number of days.
+
+    Anonymous carts go with their items; a user's cart is only deleted when
+    it is empty, since adding items does not touch the cart row itself.
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    stale = Cart.objects.filter(
+        Q(user__isnull=True) | ~Exists(CartItem.objects.filter(cart=OuterRef('pk'))),
+        updated_at__lt=cutoff,
+    )
+    return _delete_in_batches(stale, batch_size, pause)
@@ -0,0 +1,120 @@
+"""Lightweight product rows for listing pages.
+
+ProductQuerySet.cards() reads only the columns a product card shows and
+yields ProductCard rows instead of Product instances: no description,
+specifications or duplicated alias columns are fetched, and no model is
+built. Card templates read a row like a product.
+"""
+from collections import namedtuple
+
+from django.db.models.query import ValuesListIterable
+from django.urls import reverse
+
+CARD_FIELDS = (
+    'id', 'name', 'slug', 'brand', 'price_bdt', 'effective_price', 'discount_percentage',
+    'stock_quantity', 'average_rating', 'review_count', 'is_best_seller', 'is_new_arrival',
+    'main_image', 'updated_at',
+    'category_id', 'category__name', 'category__slug', 'category__icon',
+)
+
+CardCategory = namedtuple('CardCategory', 'id name slug icon')
+CardImage = namedtuple('CardImage', 'name url')
+
+
+def stock_status(quantity):
+    """Stock label shown for a product with the given stock quantity"""
+    if quantity == 0:
+        return "Out of Stock"
+    elif quantity < 10:
+        return f"Only {quantity} left"
+    else:
+        return "In Stock"
+
+
+class ProductCard:
+    """A product as a listing card shows it, with its URL and stock label
+    worked out up front. Annotations of the queryset are kept as well."""
+    __slots__ = (
+        'id', 'name', 'slug', 'brand', 'price_bdt', 'effective_price', 'discount_percentage',
+        'stock_quantity', 'average_rating', 'review_count', 'is_best_seller', 'is_new_arrival',
+        'main_image', 'updated_at', 'category', 'url', 'stock_status', 'annotations',
+    )
+
+    def __getattr__(self, name):
+        # Only reached for attributes that are not slots, or not set yet
+        if name != 'annotations':
+            try:
+                return self.annotations[name]
+            except (AttributeError, KeyError):
+                pass
+        raise AttributeError(f"'ProductCard' object has no attribute '{name}'")
+
+    def __repr__(self):
+        return f'<ProductCard: {self.name}>'
+
+    def __eq__(self, other):
+        return isinstance(other, ProductCard) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def category_id(self):
+        return self.category.id
+
+    @property
+    def current_price(self):
+        return self.effective_price
+
+    @property
+    def price(self):
+        return self.price_bdt
+
+    @property
+    def stock(self):
+        return self.stock_quantity
+
+    @property
+    def is_in_stock(self):
+        return self.stock_quantity > 0
+
+    def get_absolute_url(self):
+        return self.url
+
+
+class ProductCardIterable(ValuesListIterable):
+    """Yield a ProductCard for each row of a values_list() of CARD_FIELDS
+    followed by the queryset's annotations"""
+
+    def __iter__(self):
+        queryset = self.queryset
+        storage = queryset.model._meta.get_field('main_image').storage
+        # Slugs are [-a-zA-Z0-9_], so one reversed URL serves as a template for all
+        prefix, suffix = reverse('store:product_detail', args=['slug']).rsplit('slug', 1)
+        annotation_names = queryset._fields[len(CARD_FIELDS):]
+        categories = {}
+
+        for row in super().__iter__():
+            card = ProductCard()
+            (
+                card.id, card.name, card.slug, card.brand, card.price_bdt, card.effective_price,
+                card.discount_percentage, card.stock_quantity, card.average_rating,
+                card.review_count, card.is_best_seller, card.is_new_arrival, image,
+                card.updated_at, category_id, category_name, category_slug, category_icon,
+            ) = row[:len(CARD_FIELDS)]
+            card.annotations = dict(zip(annotation_names, row[len(CARD_FIELDS):]))
+
+            card.main_image = CardImage(image, storage.url(image)) if image else None
+            category = categories.get(category_id)
+            if category is None:
+                category = categories[category_id] = CardCategory(
+                    category_id, category_name, category_slug, category_icon
+                )
+            card.category = category
+            card.url = f'{prefix}{card.slug}{suffix}'
+            card.stock_status = stock_status(card.stock_quantity)
+            yield card
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from store.models import Sale
+
+
+class Command(BaseCommand):
+    help = 'Switch flash sales on or off as their start and end times pass (run every minute from cron)'
+
+    def handle(self, *args, **options):
+        started, ended, products = Sale.apply_due()
+        self.stdout.write(
+            f'{started} sale(s) started, {ended} ended, {products} product(s) repriced'
+        )
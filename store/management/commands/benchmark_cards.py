@@ -0,0 +1,73 @@
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from store.cards import CSRF_PLACEHOLDER
+from store.models import Product
+
+
+def _measure(function, repeat):
+    """(best seconds, peak bytes allocated) of calling function"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+class Command(BaseCommand):
+    help = 'Compare loading and rendering product cards from model instances and from cards() rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help='Products to load')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--variant', default='category', help='Card template in store/cards/')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        repeat = options['repeat']
+        template = f"store/cards/{options['variant']}.html"
+
+        products = Product.objects.filter(is_active=True).with_converted_price(
+            settings.STORE_SECONDARY_CURRENCY
+        ).order_by('pk')
+        loaded = products[:count].count()
+        if not loaded:
+            self.stderr.write('No active products to load')
+            return
+        self.stdout.write(f'{loaded} products, {template}; per 1,000 cards:')
+
+        ways = {
+            'models': products.select_related('category'),
+            'cards()': products.cards(),
+        }
+        for name, queryset in ways.items():
+            rows = list(queryset[:count])
+            load_time, load_memory = _measure(lambda: list(queryset[:count]), repeat)
+            render_time, _ = _measure(lambda: [
+                # Rendered without the card cache, as on a cache miss
+                render_to_string(template, {
+                    'product': row,
+                    'secondary_currency': settings.STORE_SECONDARY_CURRENCY,
+                    'csrf_token': CSRF_PLACEHOLDER,
+                })
+                for row in rows
+            ], repeat)
+            scale = 1000 / loaded
+            self.stdout.write(
+                f'{name:8}  load {load_time * scale * 1000:7.1f} ms  '
+                f'{load_memory * scale / 1024:8.0f} KiB  '
+                f'render {render_time * scale * 1000:7.1f} ms'
+            )
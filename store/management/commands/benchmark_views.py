@@ -0,0 +1,66 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+
+
+def _summary(latencies, elapsed):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else latencies[-1]
+    return (
+        f'{len(latencies) / elapsed:8.1f} req/s  '
+        f'p50 {statistics.median(latencies) * 1000:7.1f} ms  '
+        f'p95 {p95 * 1000:7.1f} ms'
+    )
+
+
+class Command(BaseCommand):
+    help = 'Compare WSGI and ASGI latency of a page under concurrent load'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='URL path to request, e.g. /products/<slug>/')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=20)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        total = options['requests']
+        concurrency = options['concurrency']
+
+        # Bypass the anonymous page cache so the view itself is measured
+        with override_settings(ALLOWED_HOSTS=['testserver'], STORE_PAGE_CACHE_VIEWS=[]):
+            self.stdout.write(f'{total} requests to {path}, {concurrency} concurrent')
+            self.stdout.write('WSGI  ' + self._run_wsgi(path, total, concurrency))
+            self.stdout.write('ASGI  ' + asyncio.run(self._run_asgi(path, total, concurrency)))
+
+    def _run_wsgi(self, path, total, concurrency):
+        def fetch(_):
+            # A fresh client per request, so every request is a new visitor
+            start = time.perf_counter()
+            response = Client().get(path)
+            if response.status_code != 200:
+                raise RuntimeError(f'{path} returned {response.status_code}')
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(fetch, range(total)))
+        return _summary(latencies, time.perf_counter() - start)
+
+    async def _run_asgi(self, path, total, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await AsyncClient().get(path)
+                if response.status_code != 200:
+                    raise RuntimeError(f'{path} returned {response.status_code}')
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(fetch() for _ in range(total)))
+        return _summary(latencies, time.perf_counter() - start)
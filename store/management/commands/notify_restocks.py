@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.notifications import fan_out_restocks
+
+
+class Command(BaseCommand):
+    help = 'Queue back-in-stock emails for restocked products (run every minute from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Subscribers queued per transaction')
+
+    def handle(self, *args, **options):
+        events, emails = fan_out_restocks(batch_size=options['batch_size'])
+        self.stdout.write(f'{events} restock(s) processed, {emails} email(s) queued')
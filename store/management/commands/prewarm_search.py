@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from store.models import SearchTerm
+from store.search import prewarm_search_cache
+
+
+class Command(BaseCommand):
+    help = 'Save buffered search counts and cache the results of the most popular queries (run every few minutes from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=100, help='Number of queries to warm')
+        parser.add_argument('--days', type=int, default=30, help='Only warm queries searched this recently')
+
+    def handle(self, *args, **options):
+        flushed = SearchTerm.flush_counts()
+        self.stdout.write(f'{flushed} search term count(s) saved')
+        warmed = prewarm_search_cache(top=options['top'], days=options['days'])
+        self.stdout.write(f'{warmed} search(es) warmed')
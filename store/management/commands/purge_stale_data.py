@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.housekeeping import purge_expired_sessions, purge_stale_carts
+
+
+class Command(BaseCommand):
+    help = 'Delete expired sessions and abandoned carts in small batches (run nightly from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Age in days of a cart considered abandoned')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.1, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        batching = {'batch_size': options['batch_size'], 'pause': options['pause']}
+        self._report('Sessions', lambda: purge_expired_sessions(**batching))
+        self._report('Carts', lambda: purge_stale_carts(days=options['days'], **batching))
+
+    def _report(self, name, purge):
+        start = time.perf_counter()
+        deleted = purge()
+        elapsed = time.perf_counter() - start
+        rows = sum(deleted.values())
+        details = ', '.join(f'{count} {label}' for label, count in sorted(deleted.items()))
+        self.stdout.write(
+            f'{name}: deleted {rows} row(s) in {elapsed:.1f} s '
+            f'({rows / elapsed if elapsed else 0:.0f} rows/s){": " + details if details else ""}'
+        )
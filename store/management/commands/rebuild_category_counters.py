@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.cache import bump_version
+from store.models import Category
+
+
+class Command(BaseCommand):
+    help = "Recompute every category's product counts and price range (run nightly from cron)"
+
+    def handle(self, *args, **options):
+        categories = Category.objects.rebuild_product_counters()
+        # The counters were written with update(), which sends no signals
+        bump_version('catalog')
+        self.stdout.write(f'{categories} categor(ies) rebuilt')
@@ -0,0 +1,42 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from store.outbox import send_batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Send queued emails in batches over one SMTP connection (run continuously with --loop). '
+        'To try it locally, start "python -m aiosmtpd -n -l localhost:1025" and pass '
+        '--host localhost --port 1025.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new emails')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--host', help='SMTP host instead of EMAIL_HOST, without TLS or login')
+        parser.add_argument('--port', type=int, help='SMTP port instead of EMAIL_PORT')
+
+    def handle(self, *args, **options):
+        overrides = {}
+        if options['host']:
+            overrides = {'host': options['host'], 'use_tls': False, 'username': '', 'password': ''}
+        if options['port']:
+            overrides['port'] = options['port']
+
+        # Opened on the first send and kept open between batches
+        connection = get_connection(**overrides)
+        try:
+            while True:
+                sent, failed = send_batch(connection, options['batch_size'])
+                if sent or failed:
+                    self.stdout.write(f'Sent {sent} email(s), {failed} failed')
+                if not options['loop']:
+                    break
+                if sent + failed < options['batch_size']:
+                    time.sleep(options['interval'])
+        finally:
+            connection.close()
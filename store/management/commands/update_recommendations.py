@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from store.recommendations import update_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Update "frequently bought together" recommendations from new orders (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=6, help='Recommendations kept per product')
+        parser.add_argument('--rebuild', action='store_true', help='Recount every order from scratch')
+
+    def handle(self, *args, **options):
+        orders, products = update_recommendations(
+            top_k=options['top_k'], rebuild=options['rebuild']
+        )
+        self.stdout.write(f'Processed {orders} order(s), updated {products} product(s)')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.reporting import update_rollups
+
+
+class Command(BaseCommand):
+    help = 'Fold new and changed orders into the daily, weekly and monthly sales rollups (run every few minutes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Recompute every rollup from all orders')
+
+    def handle(self, *args, **options):
+        days = update_rollups(rebuild=options['rebuild'])
+        self.stdout.write(f'Refreshed {days} day(s) of sales rollups')
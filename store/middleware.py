@@ -0,0 +1,164 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+
+from .cache import get_versions
+from .models import ExchangeRate
+from .ratelimit import record_rejection, take_token, view_name
+
+
+IGNORED_QUERY_PARAMS = {'fbclid', 'gclid'}
+
+
+def normalize_query_string(query_dict):
+    """Sort parameters and drop empty values and tracking parameters"""
+    items = []
+    for key in sorted(query_dict.keys()):
+        if key in IGNORED_QUERY_PARAMS or key.startswith('utm_'):
+            continue
+        for value in sorted(query_dict.getlist(key)):
+            value = value.strip()
+            if value:
+                items.append(f'{key}={value}')
+    return '&'.join(items)
+
+
+class CookieCartMiddleware:
+    """Write an anonymous visitor's cart back to its cookie when it changed"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        cart = getattr(request, '_cookie_cart', None)
+        if cart is not None and cart.modified:
+            cart.save(response)
+        return response
+
+
+class RateLimitMiddleware:
+    """Answer 429 to clients over a view's limit in STORE_RATE_LIMITS.
+
+    The check runs in process_view, before the view and the middleware
+    below this one, so a rejected request costs no database queries.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limits = getattr(settings, 'STORE_RATE_LIMITS', {})
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        name = view_name(view_func)
+        limit = self.limits.get(name)
+        if limit is None:
+            return None
+        session_rate, ip_rate, per, *methods = limit
+        if methods and request.method not in methods[0]:
+            return None
+        retry_after = take_token(request, name, session_rate, ip_rate, per)
+        if not retry_after:
+            return None
+
+        record_rejection(name)
+        message = 'Too many requests. Please try again shortly.'
+        if request.path.startswith('/api/'):
+            response = JsonResponse({'success': False, 'error': message}, status=429)
+        else:
+            response = HttpResponse(message, status=429, content_type='text/plain')
+        response['Retry-After'] = str(retry_after)
+        return response
+
+
+class AnonymousPageCacheMiddleware:
+    """Serve catalog pages to anonymous visitors from a shared cache.
+
+    Pages are rendered with the per-visitor parts (cart and wishlist counts,
+    messages, CSRF tokens) left as placeholders, which main.js fills in from
+    ``store:session_fragments``. A view records what the page depends on in
+    ``request.cache_dependencies``; a cached copy is only served while all of
+    those version counters are unchanged.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.views = set(getattr(settings, 'STORE_PAGE_CACHE_VIEWS', []))
+        self.timeout = getattr(settings, 'STORE_PAGE_CACHE_TIMEOUT', 300)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            getattr(request, 'page_cached', False)
+            and not response.has_header('X-Page-Cache')
+            # A page that read the visitor's CSRF token must not be shared
+            and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+            and self._can_store(response)
+        ):
+            self._store(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        match = request.resolver_match
+        if match is None or match.url_name not in self.views:
+            return None
+        if request.user.is_authenticated:
+            return None
+
+        request.page_cached = True
+        request.cache_dependencies = [('catalog',)]
+
+        entry = cache.get(self._cache_key(request))
+        if entry is None:
+            return None
+        namespaces = [tuple(parts) for parts in entry['versions']]
+        if get_versions(namespaces) != list(entry['versions'].values()):
+            return None
+
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        for header, value in entry['headers'].items():
+            response[header] = value
+        response['X-Page-Cache'] = 'hit'
+        return get_conditional_response(
+            request,
+            etag=response.get('ETag'),
+            last_modified=None,
+            response=response,
+        )
+
+    def _cache_key(self, request):
+        # Pages show converted prices, and a scheduled exchange rate takes
+        # effect without a save to bump any version
+        rate = ExchangeRate.get_rate(settings.STORE_SECONDARY_CURRENCY)
+        path = request.path + '?' + normalize_query_string(request.GET)
+        return f'page:{rate}:' + hashlib.md5(path.encode()).hexdigest()
+
+    def _can_store(self, response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and 'no-store' not in response.get('Cache-Control', '')
+            and 'private' not in response.get('Cache-Control', '')
+        )
+
+    def _store(self, request, response):
+        namespaces = [tuple(parts) for parts in request.cache_dependencies]
+        entry = {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'headers': {
+                header: response[header]
+                for header in ('ETag', 'Last-Modified')
+                if response.has_header(header)
+            },
+            'versions': dict(zip(namespaces, get_versions(namespaces))),
+        }
+        cache.set(self._cache_key(request), entry, self.timeout)
+        response['X-Page-Cache'] = 'miss'
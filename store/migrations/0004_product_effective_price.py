@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-19 02:38
+
+from django.db import migrations, models
+from decimal import Decimal
+
+from django.db.models import F, Value
+from django.db.models.functions import Round
+
+
+def populate_effective_price(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    # Multiplied by 0.01 since SQLite divides whole prices as integers
+    Product.objects.update(
+        effective_price=Round(
+            F('price_bdt') * (100 - F('discount_percentage')) * Value(Decimal('0.01')),
+            2,
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_alter_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(populate_effective_price, migrations.RunPython.noop),
+    ]
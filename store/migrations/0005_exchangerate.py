@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-19 02:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3)),
+                ('rate', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('effective_from', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-effective_from'],
+                'indexes': [models.Index(fields=['currency', '-effective_from'], name='store_excha_currenc_07e61a_idx')],
+            },
+        ),
+    ]
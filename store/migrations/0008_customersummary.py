@@ -0,0 +1,64 @@
+# Generated by Django 5.2.5 on 2026-10-19 02:49
+
+import django.db.models.deletion
+from django.conf import settings
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_customer_summaries(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    CustomerSummary = apps.get_model('store', 'CustomerSummary')
+    totals = Order.objects.filter(user__isnull=False).values('user_id').annotate(
+        order_count=Count('id'),
+        active_order_count=Count(
+            'id', filter=Q(status__in=['pending', 'confirmed', 'processing', 'shipped'])
+        ),
+        lifetime_spend=Coalesce(Sum('total', filter=~Q(status='cancelled')), Decimal(0)),
+        last_order_id=Max('id'),
+    ).order_by()
+    CustomerSummary.objects.bulk_create(
+        [CustomerSummary(**row) for row in totals.iterator()], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_recommendations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('active_order_count', models.PositiveIntegerField(default=0)),
+                ('lifetime_spend', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'customer summaries',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-id'], name='store_order_user_id_0f2f91_idx'),
+        ),
+        migrations.AddField(
+            model_name='customersummary',
+            name='last_order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='store.order'),
+        ),
+        migrations.AddField(
+            model_name='customersummary',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='order_summary', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(populate_customer_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-19 03:19
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Category = apps.get_model('store', 'Category')
+    Product = apps.get_model('store', 'Product')
+
+    def stat(aggregate):
+        return Subquery(
+            Product.objects.filter(
+                category=OuterRef('pk'), is_active=True, is_available=True
+            ).order_by().values('category').annotate(value=aggregate).values('value')
+        )
+
+    Category.objects.update(
+        product_count=Coalesce(stat(Count('pk')), 0),
+        in_stock_count=Coalesce(stat(Count('pk', filter=Q(stock_quantity__gt=0))), 0),
+        min_price=stat(Min('effective_price')),
+        max_price=stat(Max('effective_price')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_searchterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='in_stock_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='max_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='min_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Round
+
+
+def recompute_effective_price(apps, schema_editor):
+    """Redo effective_price, which SQLite had computed with integer division
+    for whole prices, and the category price ranges built from it"""
+    Category = apps.get_model('store', 'Category')
+    Product = apps.get_model('store', 'Product')
+    SaleItem = apps.get_model('store', 'SaleItem')
+
+    sale_price = SaleItem.objects.filter(
+        product=OuterRef('pk'), sale__is_applied=True
+    ).order_by('sale_price').values('sale_price')[:1]
+    Product.objects.update(
+        effective_price=Coalesce(
+            Subquery(sale_price),
+            Round(
+                F('price_bdt') * (100 - F('discount_percentage')) * Value(Decimal('0.01')),
+                2,
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            ),
+        )
+    )
+
+    def stat(aggregate):
+        return Subquery(
+            Product.objects.filter(
+                category=OuterRef('pk'), is_active=True, is_available=True
+            ).order_by().values('category').annotate(value=aggregate).values('value')
+        )
+
+    Category.objects.update(
+        product_count=Coalesce(stat(Count('pk')), 0),
+        in_stock_count=Coalesce(stat(Count('pk', filter=Q(stock_quantity__gt=0))), 0),
+        min_price=stat(Min('effective_price')),
+        max_price=stat(Max('effective_price')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_category_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(recompute_effective_price, migrations.RunPython.noop),
+    ]
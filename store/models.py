@@ -1,17 +1,58 @@
 # store/models.py
 from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, Exists, F, Max, Min, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least, Round
 from django.contrib.auth.models import User
 from django.utils import timezone
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+import hashlib
 import json
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils.text import slugify  # Add this import
 
+from .cache import bump_product_versions
+from .listing import CARD_FIELDS, ProductCardIterable, stock_status
+
+def _listed_products_stat(aggregate):
+    """Subquery of an aggregate over the listed products of the outer category"""
+    return Subquery(
+        Product.objects.filter(
+            category=OuterRef('pk'), is_active=True, is_available=True
+        ).order_by().values('category').annotate(value=aggregate).values('value')
+    )
+
+class CategoryQuerySet(models.QuerySet):
+    def rebuild_product_counters(self):
+        """Recompute the product counters of these categories in one UPDATE"""
+        return self.update(
+            product_count=Coalesce(_listed_products_stat(Count('pk')), 0),
+            in_stock_count=Coalesce(
+                _listed_products_stat(Count('pk', filter=Q(stock_quantity__gt=0))), 0
+            ),
+            min_price=_listed_products_stat(Min('effective_price')),
+            max_price=_listed_products_stat(Max('effective_price')),
+        )
+
 class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
     icon = models.CharField(max_length=50, default='fas fa-microchip')
     description = models.TextField(blank=True)
     
+    # Listed (active and available) products, kept up to date as products
+    # change; the rebuild_category_counters command recomputes them
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    in_stock_count = models.PositiveIntegerField(default=0, editable=False)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    
+    objects = CategoryQuerySet.as_manager()
+    
     class Meta:
         verbose_name_plural = "Categories"
     
@@ -25,6 +66,192 @@ class Category(models.Model):
     
     def get_absolute_url(self):
         return reverse('category_detail', kwargs={'slug': self.slug})
+    
+    @classmethod
+    def update_product_counters(cls, old, new):
+        """Move category counters for a product whose Product.counter_state()
+        went from old to new (None while it is not listed).
+
+        Counts move by one and a new price widens the range; a price range
+        is only recomputed when the product held one of its ends.
+        """
+        if old == new:
+            return
+        changes = {}
+        for state, sign in ((old, -1), (new, 1)):
+            if state is None:
+                continue
+            category_id, in_stock, price = state
+            change = changes.setdefault(category_id, {
+                'product_count': 0, 'in_stock_count': 0, 'added': None, 'removed': None,
+            })
+            change['product_count'] += sign
+            change['in_stock_count'] += sign * in_stock
+            change['added' if sign > 0 else 'removed'] = price
+        
+        for category_id, change in changes.items():
+            added, removed = change['added'], change['removed']
+            min_price, max_price = F('min_price'), F('max_price')
+            if added is not None:
+                added = Value(added, output_field=models.DecimalField(max_digits=10, decimal_places=2))
+                min_price = Least(Coalesce(min_price, added), added)
+                max_price = Greatest(Coalesce(max_price, added), added)
+            if removed is not None:
+                min_price = Case(
+                    When(min_price=removed, then=_listed_products_stat(Min('effective_price'))),
+                    default=min_price,
+                )
+                max_price = Case(
+                    When(max_price=removed, then=_listed_products_stat(Max('effective_price'))),
+                    default=max_price,
+                )
+            cls.objects.filter(pk=category_id).update(
+                product_count=F('product_count') + change['product_count'],
+                in_stock_count=F('in_stock_count') + change['in_stock_count'],
+                min_price=min_price,
+                max_price=max_price,
+            )
+
+_exchange_rate_cache = {}
+
+class ExchangeRate(models.Model):
+    """BDT price of one unit of a foreign currency from a given time"""
+    currency = models.CharField(max_length=3)
+    rate = models.DecimalField(max_digits=12, decimal_places=4)
+    effective_from = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-effective_from']
+        indexes = [models.Index(fields=['currency', '-effective_from'])]
+    
+    def __str__(self):
+        return f"1 {self.currency} = ৳{self.rate} from {self.effective_from:%Y-%m-%d}"
+    
+    @classmethod
+    def get_rate(cls, currency):
+        """Current rate for a currency, held in a per-process cache until
+        EXCHANGE_RATE_CACHE_TTL passes or the next scheduled rate takes effect.
+
+        Falls back to settings.EXCHANGE_RATE_FALLBACKS when no rate has been
+        entered yet. Returns None for currencies with neither.
+        """
+        if currency == 'BDT':
+            return Decimal(1)
+        
+        now = timezone.now()
+        cached = _exchange_rate_cache.get(currency)
+        if cached and cached[1] > now:
+            return cached[0]
+        
+        rate = cls.objects.filter(
+            currency=currency, effective_from__lte=now
+        ).values_list('rate', flat=True).first()
+        if rate is None:
+            fallback = settings.EXCHANGE_RATE_FALLBACKS.get(currency)
+            rate = Decimal(str(fallback)) if fallback is not None else None
+        
+        # Held no later than the next scheduled rate takes effect
+        expiry = now + timedelta(seconds=settings.EXCHANGE_RATE_CACHE_TTL)
+        next_change = cls.objects.filter(
+            currency=currency, effective_from__gt=now
+        ).order_by('effective_from').values_list('effective_from', flat=True).first()
+        if next_change is not None:
+            expiry = min(expiry, next_change)
+        _exchange_rate_cache[currency] = (rate, expiry)
+        return rate
+    
+    @staticmethod
+    def clear_cache():
+        _exchange_rate_cache.clear()
+
+def discounted_price():
+    """price_bdt less discount_percentage in SQL, rounded half up to the
+    paisa like Product.calculate_effective_price().
+
+    It multiplies by 0.01 rather than dividing by 100: SQLite stores whole
+    prices as integers and would divide them as integers.
+    """
+    return Round(
+        F('price_bdt') * (100 - F('discount_percentage')) * Value(Decimal('0.01')),
+        2,
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    )
+
+# Products above which a bulk update() bumps only their categories' versions
+PRODUCT_VERSION_BUMP_LIMIT = 100
+
+# Product columns the category counters are computed from
+COUNTER_FIELDS = {'category_id', 'is_active', 'is_available', 'stock_quantity', 'effective_price'}
+
+class ProductQuerySet(models.QuerySet):
+    def with_converted_price(self, currency):
+        """Annotate converted_price: effective_price in the given currency"""
+        rate = ExchangeRate.get_rate(currency)
+        if rate is None:
+            raise ValueError(f"No exchange rate for {currency}")
+        # Multiplied by the inverse rate, since SQLite would divide a whole
+        # price by a whole rate (such as a fallback of 110) as integers
+        return self.annotate(
+            converted_price=Round(
+                F('effective_price') * Value(1 / Decimal(rate)),
+                2,
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            )
+        )
+    
+    def cards(self):
+        """Lean ProductCard rows of just the card columns (see store.listing).
+
+        Call it last: the annotations made so far are carried over.
+        """
+        clone = self.values_list(*CARD_FIELDS, *self.query.annotations)
+        clone._iterable_class = ProductCardIterable
+        return clone
+    
+    def update(self, **kwargs):
+        # Bulk updates skip save() and its signals, so restocks, category
+        # counters, updated_at and cached pages are handled here; bulk_update()
+        # ends up here as well
+        kwargs.setdefault('updated_at', timezone.now())
+        new_category = next(
+            (getattr(kwargs[name], 'pk', kwargs[name]) for name in ('category', 'category_id') if name in kwargs),
+            None,
+        )
+        with transaction.atomic(using=self.db):
+            products = list(self.order_by().values_list('pk', 'category_id')[:PRODUCT_VERSION_BUMP_LIMIT + 1])
+            if len(products) > PRODUCT_VERSION_BUMP_LIMIT:
+                # Too many to bump one by one: cards and product ETags carry
+                # updated_at and product pages their category's version, so
+                # moving the categories is enough
+                category_ids = set(self.order_by().values_list('category_id', flat=True).distinct())
+                products = []
+            else:
+                category_ids = {category_id for _, category_id in products}
+            sold_out = []
+            if 'stock_quantity' in kwargs:
+                sold_out = list(self.filter(stock_quantity=0).values_list('pk', flat=True))
+            rows = super().update(**kwargs)
+            RestockEvent.record(sold_out)
+            if new_category is not None and category_ids:
+                category_ids.add(new_category)
+            if COUNTER_FIELDS & {self.model._meta.get_field(name).attname for name in kwargs}:
+                Category.objects.filter(pk__in=category_ids).rebuild_product_counters()
+            # Bumped once committed, so nothing caches the old rows meanwhile
+            transaction.on_commit(
+                lambda: bump_product_versions(products, category_ids), using=self.db
+            )
+        return rows
+    
+    def refresh_effective_prices(self):
+        """Recompute effective_price after a bulk update() of prices or discounts.
+
+        A running sale's price takes precedence over the discounted price.
+        """
+        sale_price = SaleItem.objects.filter(
+            product=OuterRef('pk'), sale__is_applied=True
+        ).order_by('sale_price').values('sale_price')[:1]
+        return self.update(effective_price=Coalesce(Subquery(sale_price), discounted_price()))
 
 class Product(models.Model):
     CURRENCY_CHOICES = [
@@ -51,6 +278,8 @@ class Product(models.Model):
     price_usd = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default='BDT')
     discount_percentage = models.PositiveIntegerField(default=0)
+    # Discounted price kept in the database so listings can sort and filter on it
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, db_index=True, editable=False)
     
     # Stock and availability for Bangladesh
     stock_quantity = models.PositiveIntegerField(default=0)
@@ -91,7 +320,9 @@ class Product(models.Model):
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Conditional GET validator
+    
+    objects = ProductQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
@@ -103,6 +334,11 @@ class Product(models.Model):
         if not self.slug:
             self.slug = slugify(self.name)
         
+        self.effective_price = self.calculate_effective_price()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'price_bdt', 'discount_percentage'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'effective_price'}
+        
         # Set aliases for compatibility
         if not self.old_price and self.discount_percentage > 0:
             self.old_price = self.price_bdt
@@ -116,17 +352,67 @@ class Product(models.Model):
         if not self.image:
             self.image = self.main_image
         
-        super().save(*args, **kwargs)
+        stock_saved = kwargs.get('update_fields') is None or 'stock_quantity' in kwargs['update_fields']
+        counters_saved = kwargs.get('update_fields') is None or bool(
+            COUNTER_FIELDS & {self._meta.get_field(name).attname for name in kwargs['update_fields']}
+        )
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if stock_saved and getattr(self, '_loaded_stock_quantity', None) == 0 and self.stock_quantity > 0:
+                RestockEvent.record([self.pk])
+            
+            if counters_saved:
+                counter_state = self.counter_state()
+                if adding:
+                    Category.update_product_counters(None, counter_state)
+                elif hasattr(self, '_loaded_counter_state'):
+                    Category.update_product_counters(self._loaded_counter_state, counter_state)
+                else:
+                    # Loaded without some of the counted columns
+                    Category.objects.filter(pk=self.category_id).rebuild_product_counters()
+        if stock_saved:
+            self._loaded_stock_quantity = self.stock_quantity
+        if counters_saved:
+            self._loaded_counter_state = counter_state
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Stock as last read or saved, to spot a restock on save()
+        instance._loaded_stock_quantity = instance.__dict__.get('stock_quantity')
+        # Likewise for the category counters
+        if COUNTER_FIELDS.issubset(instance.__dict__):
+            instance._loaded_counter_state = instance.counter_state()
+        return instance
+    
+    def counter_state(self):
+        """What the category counters count of this product: (category_id,
+        in stock, effective_price), or None when it is not listed"""
+        if not (self.is_active and self.is_available):
+            return None
+        return (self.category_id, self.stock_quantity > 0, self.effective_price)
     
     def get_absolute_url(self):
         return reverse('product_detail', kwargs={'slug': self.slug})
     
+    def calculate_effective_price(self):
+        if self.pk:
+            sale_price = SaleItem.objects.filter(
+                product=self, sale__is_applied=True
+            ).order_by('sale_price').values_list('sale_price', flat=True).first()
+            if sale_price is not None:
+                return sale_price
+        
+        # Rounded like discounted_price() rounds in SQL
+        price = Decimal(self.price_bdt)
+        if self.discount_percentage > 0:
+            price = price * (100 - self.discount_percentage) / 100
+        return price.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    
     @property
     def current_price(self):
-        if self.discount_percentage > 0:
-            discount = (self.price_bdt * self.discount_percentage) / 100
-            return self.price_bdt - discount
-        return self.price_bdt
+        return self.effective_price
     
     @property
     def price(self):
@@ -144,12 +430,7 @@ class Product(models.Model):
     
     @property
     def stock_status(self):
-        if self.stock_quantity == 0:
-            return "Out of Stock"
-        elif self.stock_quantity < 10:
-            return f"Only {self.stock_quantity} left"
-        else:
-            return "In Stock"
+        return stock_status(self.stock_quantity)
     
     # Properties for template compatibility
     @property
@@ -207,6 +488,66 @@ class Product(models.Model):
 # Everything below this line should be removed
 
 # Add the ProductImage model (properly indented, NOT inside Product class)
+class Sale(models.Model):
+    """A flash sale that sets product prices between two times.
+
+    Sales are switched on and off by the apply_sales management command;
+    is_applied records whether a sale's prices are currently in effect.
+    """
+    name = models.CharField(max_length=200)
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField()
+    is_applied = models.BooleanField(default=False, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-starts_at']
+        indexes = [models.Index(fields=['starts_at', 'ends_at'])]
+    
+    def __str__(self):
+        return self.name
+    
+    @property
+    def is_running(self):
+        return self.starts_at <= timezone.now() < self.ends_at
+    
+    @classmethod
+    def apply_due(cls, now=None):
+        """Switch on sales that have started and off those that have ended.
+
+        Only products in a sale that changed state are repriced and have
+        their cached pages invalidated. Returns (started, ended, products).
+        """
+        now = now or timezone.now()
+        running = Q(starts_at__lte=now, ends_at__gt=now)
+        starting = list(cls.objects.filter(running, is_applied=False).values_list('pk', flat=True))
+        ending = list(cls.objects.filter(is_applied=True).exclude(running).values_list('pk', flat=True))
+        if not starting and not ending:
+            return 0, 0, 0
+        
+        with transaction.atomic():
+            cls.objects.filter(pk__in=starting).update(is_applied=True)
+            cls.objects.filter(pk__in=ending).update(is_applied=False)
+            # update() invalidates the repriced products' cached pages
+            repriced = Product.objects.filter(
+                pk__in=SaleItem.objects.filter(
+                    sale__in=starting + ending
+                ).values('product_id')
+            ).refresh_effective_prices()
+        
+        return len(starting), len(ending), repriced
+
+class SaleItem(models.Model):
+    sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sale_items')
+    sale_price = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    class Meta:
+        unique_together = ['sale', 'product']
+    
+    def __str__(self):
+        return f"{self.product.name} at ৳{self.sale_price} in {self.sale.name}"
+
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='product_images/')
@@ -261,6 +602,53 @@ class ProductReview(models.Model):
     class Meta:
         ordering = ['-created_at']
 
+class StockNotification(models.Model):
+    """A request to be emailed when an out-of-stock product is back"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_notifications')
+    email = models.EmailField()
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    notified_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        unique_together = ['product', 'email']
+        indexes = [
+            models.Index(fields=['product', 'notified_at']),  # Pending subscribers
+        ]
+    
+    def __str__(self):
+        return f"{self.email} waiting for {self.product_id}"
+
+class RestockEvent(models.Model):
+    """A product with waiting subscribers came back in stock.
+
+    Events are recorded in the transaction that changed the stock, and the
+    notify_restocks command fans them out to emails later, in batches.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['processed_at', 'created_at']),
+        ]
+    
+    @classmethod
+    def record(cls, product_ids):
+        """Record events for those of the products now in stock with subscribers waiting"""
+        if not product_ids:
+            return
+        restocked = Product.objects.filter(
+            pk__in=product_ids, stock_quantity__gt=0
+        ).filter(
+            Exists(StockNotification.objects.filter(product=OuterRef('pk'), notified_at__isnull=True))
+        ).exclude(
+            # One unprocessed event per product is enough
+            Exists(cls.objects.filter(product=OuterRef('pk'), processed_at__isnull=True))
+        ).values_list('pk', flat=True)
+        cls.objects.bulk_create([cls(product_id=product_id) for product_id in restocked])
+
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
     session_key = models.CharField(max_length=40, null=True, blank=True)
@@ -277,6 +665,39 @@ class Cart(models.Model):
     @property
     def total_price(self):
         return sum(item.total_price for item in self.items.all())
+    
+    @transaction.atomic
+    def merge_quantities(self, quantities):
+        """Add {product_id: quantity} lines to this cart.
+
+        Quantities of products already in the cart are summed, every merged
+        line is capped at the product's stock, and products that are out of
+        stock or gone are skipped. The number of queries does not depend on
+        the number of lines.
+        """
+        stock = dict(
+            Product.objects.filter(pk__in=quantities).values_list('pk', 'stock_quantity')
+        )
+        own = {
+            item.product_id: item
+            for item in self.items.filter(product_id__in=quantities).only('cart', 'product', 'quantity')
+        }
+        
+        changed = []
+        added = []
+        for product_id, quantity in quantities.items():
+            available = stock.get(product_id, 0)
+            if available == 0:
+                continue
+            existing = own.get(product_id)
+            if existing is not None:
+                existing.quantity = min(existing.quantity + quantity, available)
+                changed.append(existing)
+            else:
+                added.append(CartItem(cart=self, product_id=product_id, quantity=min(quantity, available)))
+        
+        CartItem.objects.bulk_update(changed, ['quantity'])
+        CartItem.objects.bulk_create(added)
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
@@ -341,6 +762,11 @@ class Order(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-id']),  # Keyset-paginated order history
+            models.Index(fields=['created_at']),  # Daily sales rollups
+            models.Index(fields=['updated_at']),  # Orders changed since the last rollup
+        ]
     
     def __str__(self):
         return self.order_number
@@ -355,6 +781,238 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.product_name}"
 
+class OutboxEmail(models.Model):
+    """An email queued in the same transaction as the change it is about.
+
+    The send_outbox command delivers queued emails, so SMTP latency and
+    failures never reach the request that queued them.
+    """
+    to = models.TextField(help_text='Comma-separated recipients')
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    send_after = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['send_after']
+        indexes = [
+            models.Index(fields=['sent_at', 'send_after']),  # Due emails
+        ]
+    
+    def __str__(self):
+        return f"{self.subject} -> {self.to}"
+    
+    @property
+    def recipients(self):
+        return [address for address in self.to.split(',') if address]
+    
+    @classmethod
+    def enqueue(cls, to, subject, template_name, context):
+        """Queue a plain-text email rendered from a template"""
+        return cls.objects.create(
+            to=','.join(to),
+            subject=subject,
+            body=render_to_string(template_name, context),
+        )
+
+class CustomerSummary(models.Model):
+    """A user's order totals for the account page, kept in step with their orders"""
+    ACTIVE_STATUSES = ['pending', 'confirmed', 'processing', 'shipped']
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='order_summary')
+    order_count = models.PositiveIntegerField(default=0)
+    active_order_count = models.PositiveIntegerField(default=0)
+    lifetime_spend = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    last_order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name_plural = 'customer summaries'
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.order_count} orders"
+    
+    @classmethod
+    def record_order(cls, order):
+        """Count a newly placed order without re-reading the user's other orders"""
+        summary, created = cls.objects.get_or_create(user_id=order.user_id)
+        is_active = order.status in cls.ACTIVE_STATUSES
+        cls.objects.filter(pk=summary.pk).update(
+            order_count=F('order_count') + 1,
+            active_order_count=F('active_order_count') + int(is_active),
+            lifetime_spend=F('lifetime_spend') + (0 if order.status == 'cancelled' else order.total),
+            last_order=order,
+            updated_at=timezone.now(),
+        )
+    
+    @classmethod
+    def rebuild(cls, user_id):
+        """Recompute a user's summary from their orders, e.g. after a status change"""
+        totals = Order.objects.filter(user_id=user_id).aggregate(
+            order_count=Count('id'),
+            active_order_count=Count('id', filter=Q(status__in=cls.ACTIVE_STATUSES)),
+            lifetime_spend=Coalesce(Sum('total', filter=~Q(status='cancelled')), Decimal(0)),
+            last_order_id=Max('id'),
+        )
+        cls.objects.update_or_create(user_id=user_id, defaults=totals)
+
+class ProductCooccurrence(models.Model):
+    """How many orders contained both products (stored in both directions)"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['product', 'other']
+
+class ProductRecommendation(models.Model):
+    """Top "frequently bought together" products for a product"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_with')
+    score = models.PositiveIntegerField()
+    rank = models.PositiveSmallIntegerField()
+    
+    class Meta:
+        ordering = ['product', 'rank']
+        unique_together = ['product', 'rank']
+    
+    def __str__(self):
+        return f"{self.product_id} -> {self.recommended_id} ({self.score})"
+
+class RecommenderState(models.Model):
+    """Progress of the incremental recommendations job (a single row)"""
+    last_order_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+class SalesRollup(models.Model):
+    """Pre-aggregated sales for one period, optionally broken down by one dimension.
+
+    Rows with dimension 'total' hold the whole period; the others hold one row
+    per value of key (a payment method, division, status, product id or
+    category id). Cancelled orders only count towards the 'status' rows.
+    """
+    PERIODS = [
+        ('day', 'Day'),
+        ('week', 'Week'),
+        ('month', 'Month'),
+    ]
+    
+    DIMENSIONS = [
+        ('total', 'Total'),
+        ('payment_method', 'Payment method'),
+        ('division', 'Division'),
+        ('status', 'Status'),
+        ('product', 'Product'),
+        ('category', 'Category'),
+    ]
+    
+    period = models.CharField(max_length=5, choices=PERIODS)
+    period_start = models.DateField()
+    dimension = models.CharField(max_length=20, choices=DIMENSIONS)
+    key = models.CharField(max_length=50, blank=True)
+    order_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        unique_together = ['period', 'period_start', 'dimension', 'key']
+        ordering = ['period', 'period_start', 'dimension', 'key']
+    
+    def __str__(self):
+        return f"{self.period} {self.period_start} {self.dimension}={self.key}"
+    
+    @property
+    def average_order_value(self):
+        return self.revenue / self.order_count if self.order_count else Decimal(0)
+
+class RollupState(models.Model):
+    """Progress of the incremental sales rollup job (a single row)"""
+    last_order_update = models.DateTimeField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+class SearchTerm(models.Model):
+    """How often a normalized search query is run, for prewarming the search cache"""
+    query = models.CharField(max_length=200, unique=True)
+    count = models.PositiveIntegerField(default=0)
+    last_searched_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['-count']),  # Most popular queries
+        ]
+    
+    def __str__(self):
+        return f"{self.query} ({self.count})"
+    
+    # Counts are buffered in the cache under a generation number, and
+    # flush_counts() moves the generation on before writing the old one out
+    BUFFER_TIMEOUT = 60 * 60 * 24  # Seconds; counts not flushed by then are lost
+    GENERATION_KEY = 'search_counts:generation'
+
+    @staticmethod
+    def _buffer_key(generation, *parts):
+        return ':'.join(['search_counts', str(generation), *(str(part) for part in parts)])
+
+    @classmethod
+    def _count_key(cls, generation, query):
+        return cls._buffer_key(generation, 'count', hashlib.md5(query.encode()).hexdigest())
+
+    @classmethod
+    def record(cls, query):
+        """Count one search for a normalized query in the cache, without a
+        database write; flush_counts() saves the counts"""
+        query = query[:200]
+        generation = cache.get_or_set(cls.GENERATION_KEY, 0, None)
+        key = cls._count_key(generation, query)
+        if not cache.add(key, 1, cls.BUFFER_TIMEOUT):
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Evicted between add() and incr()
+                cache.set(key, 1, cls.BUFFER_TIMEOUT)
+            return
+
+        # First search for the query in this generation: list it for the flush
+        length_key = cls._buffer_key(generation, 'length')
+        cache.add(length_key, 0, cls.BUFFER_TIMEOUT)
+        slot = cache.incr(length_key)
+        cache.set(cls._buffer_key(generation, 'query', slot), query, cls.BUFFER_TIMEOUT)
+
+    @classmethod
+    def flush_counts(cls):
+        """Add the search counts buffered by record() to the table.
+        Returns the number of queries written.
+
+        Searches recorded while the generation moves on may be lost, which
+        popularity counts can afford.
+        """
+        generation = cache.get_or_set(cls.GENERATION_KEY, 0, None)
+        cache.incr(cls.GENERATION_KEY)
+
+        length_key = cls._buffer_key(generation, 'length')
+        query_keys = [
+            cls._buffer_key(generation, 'query', slot)
+            for slot in range(1, (cache.get(length_key) or 0) + 1)
+        ]
+        count_keys = {query: cls._count_key(generation, query) for query in cache.get_many(query_keys).values()}
+        found = cache.get_many(list(count_keys.values()))
+        counts = {query: found[key] for query, key in count_keys.items() if found.get(key)}
+
+        now = timezone.now()
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [cls(query=query, count=0, last_searched_at=now) for query in counts],
+                ignore_conflicts=True,
+            )
+            for query, count in counts.items():
+                cls.objects.filter(query=query).update(count=F('count') + count, last_searched_at=now)
+
+        cache.delete_many([length_key, *query_keys, *count_keys.values()])
+        return len(counts)
+
 class Wishlist(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     products = models.ManyToManyField(Product, blank=True)
@@ -362,6 +1020,24 @@ class Wishlist(models.Model):
     
     def __str__(self):
         return f"{self.user.username}'s Wishlist"
+    
+    @staticmethod
+    def product_ids_cache_key(user_id):
+        return f'wishlist_ids:{user_id}'
+    
+    @classmethod
+    def get_product_ids(cls, user):
+        """Set of product ids in the user's wishlist, cached until it changes"""
+        if not user.is_authenticated:
+            return frozenset()
+        key = cls.product_ids_cache_key(user.pk)
+        product_ids = cache.get(key)
+        if product_ids is None:
+            product_ids = frozenset(cls.products.through.objects.filter(
+                wishlist__user=user
+            ).values_list('product_id', flat=True))
+            cache.set(key, product_ids, None)
+        return product_ids
 
 class BangladeshLocation(models.Model):
     DIVISIONS = [
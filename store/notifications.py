@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import OutboxEmail, RestockEvent, StockNotification
+
+
+def fan_out_restocks(batch_size=500):
+    """Queue back-in-stock emails for unprocessed restock events.
+
+    Subscribers are handled batch_size at a time, each batch in a transaction
+    that queues its emails and marks them notified, so an interrupted run
+    picks up where it stopped. Returns (events, emails).
+    """
+    events = emails = 0
+    pending_events = RestockEvent.objects.filter(
+        processed_at__isnull=True
+    ).select_related('product').order_by('created_at')
+    for event in pending_events:
+        product = event.product
+        # A product sold out again keeps its subscribers for the next restock
+        if product.stock_quantity > 0:
+            subject = f'{product.name} is back in stock | PC Nexus Bangladesh'
+            body = render_to_string('emails/back_in_stock.txt', {
+                'product': product,
+                'product_url': settings.STORE_BASE_URL + reverse('store:product_detail', args=[product.slug]),
+            })
+            waiting = StockNotification.objects.filter(
+                product=product, notified_at__isnull=True
+            ).order_by('pk')
+            while True:
+                with transaction.atomic():
+                    batch = list(waiting.values_list('pk', 'email')[:batch_size])
+                    if not batch:
+                        break
+                    OutboxEmail.objects.bulk_create([
+                        OutboxEmail(to=email, subject=subject, body=body) for _, email in batch
+                    ])
+                    StockNotification.objects.filter(
+                        pk__in=[pk for pk, _ in batch]
+                    ).update(notified_at=timezone.now())
+                emails += len(batch)
+
+        event.processed_at = timezone.now()
+        event.save(update_fields=['processed_at'])
+        events += 1
+    return events, emails
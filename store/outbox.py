@@ -0,0 +1,65 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+# How long a claimed email is hidden from other workers while it is sent
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def retry_delay(attempts):
+    """Exponential backoff after the given number of failed attempts"""
+    delay = settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, settings.OUTBOX_MAX_RETRY_DELAY))
+
+
+def _claim(batch_size):
+    """Lease a batch of due emails so concurrent workers skip them"""
+    now = timezone.now()
+    with transaction.atomic():
+        pks = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True).filter(
+                sent_at__isnull=True,
+                attempts__lt=settings.OUTBOX_MAX_ATTEMPTS,
+                send_after__lte=now,
+            ).values_list('pk', flat=True)[:batch_size]
+        )
+        OutboxEmail.objects.filter(pk__in=pks).update(send_after=now + CLAIM_LEASE)
+    return list(OutboxEmail.objects.filter(pk__in=pks))
+
+
+def send_batch(connection, batch_size=50):
+    """Send one batch of due emails, reusing one SMTP connection for all of them.
+
+    Nothing is held locked while talking to the SMTP server. A failed email
+    is retried later with exponential backoff until OUTBOX_MAX_ATTEMPTS.
+    Returns (sent, failed).
+    """
+    sent = failed = 0
+    for email in _claim(batch_size):
+        email.attempts += 1
+        try:
+            connection.open()  # No-op while the connection is still open
+            EmailMessage(
+                email.subject,
+                email.body,
+                settings.DEFAULT_FROM_EMAIL,
+                email.recipients,
+                connection=connection,
+            ).send()
+        except Exception as exc:
+            email.last_error = f'{type(exc).__name__}: {exc}'
+            email.send_after = timezone.now() + retry_delay(email.attempts)
+            failed += 1
+            # Drop a connection the server may have broken; the next send reconnects
+            connection.close()
+        else:
+            email.sent_at = timezone.now()
+            email.last_error = ''
+            sent += 1
+        email.save(update_fields=['attempts', 'last_error', 'send_after', 'sent_at'])
+    return sent, failed
@@ -0,0 +1,78 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _cache():
+    return caches[settings.STORE_RATE_LIMIT_CACHE]
+
+
+def view_name(view_func):
+    """Dotted path of a view function, as used in STORE_RATE_LIMITS"""
+    return f'{view_func.__module__}.{view_func.__qualname__}'
+
+
+def client_ip(request):
+    """The client address, read from the header a trusted proxy sets if configured"""
+    value = request.META.get(settings.STORE_RATE_LIMIT_IP_HEADER) or request.META.get('REMOTE_ADDR', '')
+    return value.split(',')[0].strip()
+
+
+def _refill(state, capacity, per, now):
+    """Tokens in a bucket now; a missing bucket is full"""
+    if state is None:
+        return capacity
+    tokens, updated = state
+    return min(capacity, tokens + (now - updated) * capacity / per)
+
+
+def take_token(request, name, session_rate, ip_rate, per):
+    """Take a token from the client's buckets for a view.
+
+    Every IP address has a bucket, and so does every session that already
+    exists; a request needs a token from each. Buckets refill continuously
+    and hold at most one period's worth of requests. Reading and writing a
+    bucket is not atomic, so concurrent requests can overshoot slightly.
+    Returns 0 when allowed, otherwise the seconds until a token is free.
+    """
+    buckets = {f'ratelimit:{name}:ip:{client_ip(request)}': ip_rate}
+    session_key = request.session.session_key if hasattr(request, 'session') else None
+    if session_key:
+        buckets[f'ratelimit:{name}:session:{session_key}'] = session_rate
+
+    cache = _cache()
+    now = time.time()
+    states = cache.get_many(list(buckets))
+    tokens = {
+        key: _refill(states.get(key), capacity, per, now)
+        for key, capacity in buckets.items()
+    }
+
+    wait = max(
+        (1 - tokens[key]) * per / capacity
+        for key, capacity in buckets.items()
+    )
+    if wait > 0:
+        return math.ceil(wait)
+    cache.set_many({key: (value - 1, now) for key, value in tokens.items()}, per)
+    return 0
+
+
+def record_rejection(name):
+    cache = _cache()
+    key = f'ratelimit:rejected:{name}'
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, None)
+
+
+def rejection_counts():
+    """Requests rejected so far for each rate limited view"""
+    names = list(settings.STORE_RATE_LIMITS)
+    found = _cache().get_many([f'ratelimit:rejected:{name}' for name in names])
+    return {name: found.get(f'ratelimit:rejected:{name}', 0) for name in names}
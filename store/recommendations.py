@@ -0,0 +1,114 @@
+from collections import Counter
+from itertools import groupby, permutations
+
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .cache import bump_product_versions
+from .models import (
+    Order, OrderItem, Product, ProductCooccurrence, ProductRecommendation,
+    RecommenderState,
+)
+
+CHUNK_SIZE = 500
+
+
+def _count_pairs(last_order_id):
+    """Co-occurrence counts for orders placed after last_order_id"""
+    items = OrderItem.objects.filter(
+        order_id__gt=last_order_id, product__isnull=False
+    ).exclude(
+        order__status='cancelled'
+    ).order_by('order_id').values_list('order_id', 'product_id')
+
+    pairs = Counter()
+    max_order_id = last_order_id
+    for order_id, rows in groupby(items.iterator(chunk_size=2000), key=lambda row: row[0]):
+        product_ids = {product_id for _, product_id in rows}
+        pairs.update(permutations(product_ids, 2))
+        max_order_id = order_id
+    return pairs, max_order_id
+
+
+def _merge_counts(pairs):
+    """Add new pair counts to the stored sparse matrix"""
+    by_product = {}
+    for (product_id, other_id), count in pairs.items():
+        by_product.setdefault(product_id, {})[other_id] = count
+
+    product_ids = list(by_product)
+    for start in range(0, len(product_ids), CHUNK_SIZE):
+        chunk = product_ids[start:start + CHUNK_SIZE]
+        existing = ProductCooccurrence.objects.filter(product_id__in=chunk)
+        updated = []
+        for row in existing.only('id', 'product_id', 'other_id', 'count'):
+            delta = by_product[row.product_id].pop(row.other_id, None)
+            if delta:
+                row.count += delta
+                updated.append(row)
+        ProductCooccurrence.objects.bulk_update(updated, ['count'], batch_size=CHUNK_SIZE)
+        ProductCooccurrence.objects.bulk_create(
+            [
+                ProductCooccurrence(product_id=product_id, other_id=other_id, count=count)
+                for product_id in chunk
+                for other_id, count in by_product[product_id].items()
+            ],
+            batch_size=CHUNK_SIZE,
+        )
+
+
+def _rebuild_top_k(product_ids, top_k):
+    """Replace the stored recommendations of the given products"""
+    for start in range(0, len(product_ids), CHUNK_SIZE):
+        chunk = product_ids[start:start + CHUNK_SIZE]
+        ranked = ProductCooccurrence.objects.filter(product_id__in=chunk).annotate(
+            rank=Window(
+                RowNumber(),
+                partition_by=F('product_id'),
+                order_by=[F('count').desc(), F('other_id').asc()],
+            )
+        ).filter(rank__lte=top_k).values_list('product_id', 'other_id', 'count', 'rank')
+
+        ProductRecommendation.objects.filter(product_id__in=chunk).delete()
+        ProductRecommendation.objects.bulk_create(
+            [
+                ProductRecommendation(
+                    product_id=product_id, recommended_id=other_id, score=count, rank=rank
+                )
+                for product_id, other_id, count, rank in ranked
+            ],
+            batch_size=CHUNK_SIZE,
+        )
+
+
+def update_recommendations(top_k=6, rebuild=False):
+    """Fold orders placed since the last run into the recommendations.
+
+    Returns (orders_processed, products_updated).
+    """
+    with transaction.atomic():
+        state, _ = RecommenderState.objects.select_for_update().get_or_create(pk=1)
+        if rebuild:
+            ProductCooccurrence.objects.all().delete()
+            ProductRecommendation.objects.all().delete()
+            state.last_order_id = 0
+
+        pairs, max_order_id = _count_pairs(state.last_order_id)
+        orders_processed = Order.objects.filter(
+            id__gt=state.last_order_id, id__lte=max_order_id
+        ).exclude(status='cancelled').count()
+
+        _merge_counts(pairs)
+        product_ids = sorted({product_id for product_id, _ in pairs})
+        _rebuild_top_k(product_ids, top_k)
+
+        state.last_order_id = max_order_id
+        state.save()
+
+    for start in range(0, len(product_ids), CHUNK_SIZE):
+        chunk = product_ids[start:start + CHUNK_SIZE]
+        bump_product_versions(list(
+            Product.objects.filter(pk__in=chunk).values_list('pk', 'category_id')
+        ))
+    return orders_processed, len(product_ids)
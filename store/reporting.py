@@ -0,0 +1,129 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderItem, RollupState, SalesRollup
+
+# Re-read orders changed a little before the last run, in case a transaction
+# that started earlier committed after it; recomputing a day is idempotent
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+
+def period_start(day, period):
+    """First day of the week (Monday) or month that contains day"""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next_period_start(start, period):
+    if period == 'week':
+        return start + timedelta(days=7)
+    if period == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def _replace_rows(period, start, rows):
+    SalesRollup.objects.filter(period=period, period_start=start).delete()
+    SalesRollup.objects.bulk_create([
+        SalesRollup(
+            period=period,
+            period_start=start,
+            dimension=dimension,
+            key=key,
+            order_count=order_count,
+            units=units,
+            revenue=revenue,
+        )
+        for (dimension, key), (order_count, units, revenue) in rows.items()
+    ])
+
+
+def _rollup_day(day):
+    """Recompute the day rows of one local calendar day from its orders"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = start + timedelta(days=1)
+
+    rows = defaultdict(lambda: [0, 0, Decimal(0)])
+    orders = Order.objects.filter(created_at__gte=start, created_at__lt=end).annotate(
+        units=Sum('items__quantity')
+    ).order_by().values_list('status', 'payment_method', 'division', 'total', 'units')
+    for status, payment_method, division, total, units in orders:
+        groups = [('status', status)]
+        if status != 'cancelled':
+            groups += [('total', ''), ('payment_method', payment_method), ('division', division)]
+        for group in groups:
+            row = rows[group]
+            row[0] += 1
+            row[1] += units or 0
+            row[2] += total
+
+    items = OrderItem.objects.filter(
+        order__created_at__gte=start, order__created_at__lt=end, product__isnull=False
+    ).exclude(order__status='cancelled').order_by()
+    for dimension, field in (('product', 'product_id'), ('category', 'product__category_id')):
+        for key, order_count, units, revenue in items.values(field).annotate(
+            order_count=Count('order_id', distinct=True),
+            units=Sum('quantity'),
+            revenue=Sum(F('price') * F('quantity')),
+        ).values_list(field, 'order_count', 'units', 'revenue'):
+            rows[dimension, str(key)] = [order_count, units, revenue]
+
+    _replace_rows('day', day, rows)
+
+
+def _rollup_span(period, start):
+    """Recompute a week or month from its day rows"""
+    days = SalesRollup.objects.filter(
+        period='day',
+        period_start__gte=start,
+        period_start__lt=_next_period_start(start, period),
+    ).values('dimension', 'key').annotate(
+        total_orders=Sum('order_count'),
+        total_units=Sum('units'),
+        total_revenue=Sum('revenue'),
+    ).order_by()
+    _replace_rows(period, start, {
+        (row['dimension'], row['key']): (row['total_orders'], row['total_units'], row['total_revenue'])
+        for row in days
+    })
+
+
+def update_rollups(rebuild=False):
+    """Refresh the rollups of every day with orders created or changed since the last run.
+
+    Each day, week and month is recomputed in its own short transaction.
+    Returns the number of days refreshed.
+    """
+    state, _ = RollupState.objects.get_or_create(pk=1)
+    changed = Order.objects.order_by()
+    if rebuild:
+        SalesRollup.objects.all().delete()
+    elif state.last_order_update is not None:
+        changed = changed.filter(updated_at__gt=state.last_order_update - WATERMARK_OVERLAP)
+
+    latest = changed.aggregate(latest=Max('updated_at'))['latest']
+    days = sorted(
+        changed.annotate(day=TruncDate('created_at')).values_list('day', flat=True).distinct()
+    )
+
+    for day in days:
+        with transaction.atomic():
+            _rollup_day(day)
+    for period in ('week', 'month'):
+        for start in sorted({period_start(day, period) for day in days}):
+            with transaction.atomic():
+                _rollup_span(period, start)
+
+    if latest is not None:
+        state.last_order_update = latest
+        state.save()
+    return len(days)
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import get_version
+from .fuzzy import TrigramIndex
+from .models import Product, SearchTerm
+
+SEARCH_CACHE_TIMEOUT = 60 * 10  # Seconds; a catalog change keys searches anew sooner
+SEARCH_FIELDS = ['name', 'description', 'brand', 'model']
+
+FUZZY_THRESHOLD = 0.3  # Least trigram similarity of a word to count as a match
+FUZZY_MAX_RESULTS = 96
+FUZZY_INDEX_REFRESH = 30  # Seconds an outdated index may still be used
+
+_fuzzy_index = None  # (catalog version, built at, TrigramIndex)
+_fuzzy_index_lock = threading.Lock()
+
+SORTS = {
+    '-created_at': ['-created_at'],
+    'price_low': ['effective_price'],
+    'price_high': ['-effective_price'],
+    '-average_rating': ['-average_rating'],
+}
+DEFAULT_SORT = '-created_at'
+
+# Longest letter run joined to a number: "rtx", "gb" and "ti" are, "ryzen" is not
+MAX_JOINED_LETTERS = 3
+
+BANGLA_DIGITS = str.maketrans('০১২৩৪৫৬৭৮৯', '0123456789')
+
+# Shop words in Bangla script, and Banglish spellings too far off for the
+# fuzzy matching to catch, with the terms product names use
+BANGLA_TERMS = {
+    'ল্যাপটপ': 'laptop',
+    'মাউস': 'mouse',
+    'কিবোর্ড': 'keyboard',
+    'কীবোর্ড': 'keyboard',
+    'মনিটর': 'monitor',
+    'হেডফোন': 'headphone',
+    'স্পিকার': 'speaker',
+    'প্রসেসর': 'processor',
+    'গ্রাফিক্স': 'graphics',
+    'কার্ড': 'card',
+    'চার্জার': 'charger',
+    'রাউটার': 'router',
+    'প্রিন্টার': 'printer',
+    'ক্যামেরা': 'camera',
+    'জিবি': 'gb',
+    'টিবি': 'tb',
+    'kibord': 'keyboard',
+    'kiboard': 'keyboard',
+    'hedfon': 'headphone',
+    'grafics': 'graphics',
+}
+
+# Words of questions like "laptop er dam koto" ("what does a laptop cost")
+STOP_WORDS = {'দাম', 'কত', 'এর', 'dam', 'daam', 'koto', 'er'}
+
+# Bangla script to Latin letters, roughly as the word would be typed in Banglish
+BANGLA_SEQUENCES = [
+    ('\u09a1\u09bc', 'r'),  # ড় written with a nukta
+    ('\u09a2\u09bc', 'rh'),  # ঢ়
+    ('\u09af\u09bc', 'y'),  # য়
+    ('্যা', 'a'),  # Ya-phala before aa sounds like the "a" in "laptop"
+    ('্য', 'y'),
+]
+BANGLA_CONSONANTS = {
+    'ক': 'k', 'খ': 'kh', 'গ': 'g', 'ঘ': 'gh', 'ঙ': 'ng',
+    'চ': 'ch', 'ছ': 'ch', 'জ': 'j', 'ঝ': 'jh', 'ঞ': 'n',
+    'ট': 't', 'ঠ': 'th', 'ড': 'd', 'ঢ': 'dh', 'ণ': 'n',
+    'ত': 't', 'থ': 'th', 'দ': 'd', 'ধ': 'dh', 'ন': 'n',
+    'প': 'p', 'ফ': 'f', 'ব': 'b', 'ভ': 'bh', 'ম': 'm',
+    'য': 'j', 'র': 'r', 'ল': 'l', 'শ': 'sh', 'ষ': 'sh', 'স': 's', 'হ': 'h',
+    '\u09dc': 'r', '\u09dd': 'rh', '\u09df': 'y', 'ৎ': 't',  # ড় ঢ় য়
+}
+BANGLA_VOWELS = {
+    'অ': 'o', 'আ': 'a', 'ই': 'i', 'ঈ': 'i', 'উ': 'u', 'ঊ': 'u', 'ঋ': 'ri',
+    'এ': 'e', 'ঐ': 'oi', 'ও': 'o', 'ঔ': 'ou',
+    'া': 'a', 'ি': 'i', 'ী': 'i', 'ু': 'u', 'ূ': 'u', 'ৃ': 'ri',
+    'ে': 'e', 'ৈ': 'oi', 'ো': 'o', 'ৌ': 'ou',
+    'ং': 'ng', 'ঃ': '', 'ঁ': '', '্': '', '়': '', '\u200c': '', '\u200d': '',
+}
+
+# Numbers, and runs of letters (Bangla vowel signs are marks, not letters)
+_WORD_RE = re.compile(r'\d+(?:\.\d+)?|(?:[^\W\d_]|[\u0980-\u09ff\u200c\u200d])+')
+_PIECE_RE = re.compile(r'\d+(?:\.\d+)?|\D+')
+_BANGLA_RE = re.compile(r'[\u0980-\u09ff]')
+
+
+def transliterate(word):
+    """Latin spelling of a Bangla word.
+
+    A consonant followed by another consonant gets the inherent "o" vowel,
+    so "মনিটর" becomes "monitor".
+    """
+    for sequence, latin in BANGLA_SEQUENCES:
+        word = word.replace(sequence, latin)
+    letters = []
+    for i, char in enumerate(word):
+        if char in BANGLA_CONSONANTS:
+            letters.append(BANGLA_CONSONANTS[char])
+            if i + 1 < len(word) and word[i + 1] in BANGLA_CONSONANTS:
+                letters.append('o')
+        else:
+            letters.append(BANGLA_VOWELS.get(char, char))
+    return ''.join(letters)
+
+
+def normalize_query(text):
+    """Canonical form of a search query.
+
+    Case, Bangla digits, punctuation and extra whitespace are folded away,
+    and a number is joined to a short run of letters next to it (a model
+    prefix or a unit), so "RTX 4060", "rtx4060" and " rtx  ৪০৬০" all become
+    "rtx4060" and "16 GB" becomes "16gb". Bangla words are translated or
+    transliterated, and Banglish question words dropped.
+    """
+    words = []
+    for part in _WORD_RE.findall(text.translate(BANGLA_DIGITS).casefold()):
+        if part in STOP_WORDS:
+            continue
+        if part in BANGLA_TERMS:
+            part = BANGLA_TERMS[part]
+        elif _BANGLA_RE.search(part):
+            part = transliterate(part)
+        if words and words[-1][-1].isdigit() != part[0].isdigit():
+            letters = _PIECE_RE.findall(words[-1])[-1] if part[0].isdigit() else part
+            if len(letters) <= MAX_JOINED_LETTERS:
+                words[-1] += part
+                continue
+        words.append(part)
+    return ' '.join(words)
+
+
+def normalize_filters(params):
+    """The search parameters that affect the results, in canonical form"""
+    filters = {
+        'q': normalize_query(params.get('q', '')),
+        'sort': params.get('sort') if params.get('sort') in SORTS else DEFAULT_SORT,
+    }
+    category = params.get('category', '').strip().lower()
+    if category:
+        filters['category'] = category
+    # Prices beyond what price_bdt can hold are dropped, so a huge exponent
+    # can neither overflow nor blow up the filter string and cache key
+    price_field = Product._meta.get_field('price_bdt')
+    price_limit = Decimal(10) ** (price_field.max_digits - price_field.decimal_places)
+    paisa = Decimal(1).scaleb(-price_field.decimal_places)
+    for name in ('min_price', 'max_price'):
+        value = params.get(name, '').translate(BANGLA_DIGITS).replace(',', '').strip()
+        try:
+            value = Decimal(value)
+            if not value.is_finite() or abs(value) >= price_limit:
+                continue
+            filters[name] = f'{value.quantize(paisa).normalize():f}'
+        except ArithmeticError:  # InvalidOperation, Overflow and the like
+            continue
+    if params.get('stock') in ('in_stock', 'low_stock'):
+        filters['stock'] = params['stock']
+    return filters
+
+
+def _word_filter(word):
+    """Match a normalized word in any search field, also where the product
+    text has a space or hyphen between its letters and numbers"""
+    pieces = _PIECE_RE.findall(word)
+    if len(pieces) == 1:
+        lookup, value = 'icontains', word
+    else:
+        lookup, value = 'iregex', r'[\s-]?'.join(re.escape(piece) for piece in pieces)
+    condition = Q()
+    for field in SEARCH_FIELDS:
+        condition |= Q(**{f'{field}__{lookup}': value})
+    return condition
+
+
+def search_products(filters):
+    """Available products matching normalized filters, in result order"""
+    products = Product.objects.filter(is_available=True)
+    for word in filters['q'].split():
+        products = products.filter(_word_filter(word))
+
+    if 'min_price' in filters:
+        products = products.filter(effective_price__gte=filters['min_price'])
+    if 'max_price' in filters:
+        products = products.filter(effective_price__lte=filters['max_price'])
+    if 'category' in filters:
+        products = products.filter(category__slug=filters['category'])
+    if filters.get('stock') == 'in_stock':
+        products = products.filter(stock_quantity__gt=0)
+    elif filters.get('stock') == 'low_stock':
+        products = products.filter(stock_quantity__gt=0, stock_quantity__lt=10)
+
+    return products.order_by(*SORTS[filters['sort']], '-pk')
+
+
+def fuzzy_index():
+    """This process's trigram index of available products' names, brands,
+    models and categories.
+
+    It is rebuilt on the first search after the catalog version moves, but
+    at most every FUZZY_INDEX_REFRESH seconds; results are checked against
+    the database anyway, so products gone since are never shown.
+    """
+    global _fuzzy_index
+    version = get_version('catalog')
+    current = _fuzzy_index
+    if current is not None and (
+        current[0] == version or time.monotonic() - current[1] < FUZZY_INDEX_REFRESH
+    ):
+        return current[2]
+
+    # Keep answering from the old index while another thread builds the new one
+    if not _fuzzy_index_lock.acquire(blocking=current is None):
+        return current[2]
+    try:
+        if _fuzzy_index is not current:
+            return _fuzzy_index[2]
+        rows = Product.objects.filter(is_available=True).values_list(
+            'pk', 'name', 'brand', 'model', 'category__name'
+        )
+        index = TrigramIndex(
+            (pk, normalize_query(' '.join(text for text in texts if text)).split())
+            for pk, *texts in rows
+        )
+        _fuzzy_index = (version, time.monotonic(), index)
+        return index
+    finally:
+        _fuzzy_index_lock.release()
+
+
+def fuzzy_product_ids(filters):
+    """Ids of products whose words are close to the query's, most similar first"""
+    ranked = fuzzy_index().search(
+        filters['q'].split(), threshold=FUZZY_THRESHOLD, limit=FUZZY_MAX_RESULTS
+    )
+    matching = set(search_products(dict(filters, q='')).filter(
+        pk__in=ranked
+    ).values_list('pk', flat=True))
+    return [pk for pk in ranked if pk in matching]
+
+
+def search_product_ids(filters):
+    """(ids, fuzzy) of the products matching normalized filters, cached per catalog version.
+
+    When no product contains the query words, products with similarly
+    spelled words are returned instead, ranked by similarity, and fuzzy is True.
+    """
+    digest = hashlib.md5(json.dumps(filters, sort_keys=True).encode()).hexdigest()
+    key = f'search:{get_version("catalog")}:{digest}'
+    result = cache.get(key)
+    if result is None:
+        ids = list(search_products(filters).values_list('pk', flat=True))
+        fuzzy = False
+        if not ids and filters['q']:
+            ids = fuzzy_product_ids(filters)
+            fuzzy = bool(ids)
+        result = (ids, fuzzy)
+        cache.set(key, result, SEARCH_CACHE_TIMEOUT)
+    return result
+
+
+def prewarm_search_cache(top=100, days=30):
+    """Cache the results of the most frequent queries of the last days.
+
+    Only the plain query (no filters, default sort) is warmed, which is what
+    a search from the header runs. Returns the number of queries warmed.
+    """
+    since = timezone.now() - timedelta(days=days)
+    queries = list(SearchTerm.objects.filter(
+        last_searched_at__gte=since
+    ).order_by('-count').values_list('query', flat=True)[:top])
+    for query in queries:
+        search_product_ids(normalize_filters({'q': query}))
+    return len(queries)
@@ -0,0 +1,133 @@
+from django.core.cache import cache
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .cache import bump_version
+from .models import (
+    FAQ, Category, CustomerSummary, ExchangeRate, Order, Product, ProductImage,
+    ProductReview, Review, Sale, SaleItem, Wishlist,
+)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    """Category pages and the catalog listings depend on category rows"""
+    bump_version('category', instance.pk)
+    bump_version('catalog')
+    bump_version('product_cards')  # Cards show the category name and icon
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, **kwargs):
+    """Invalidate cached data for a product and the listings that show it"""
+    bump_version('product', instance.pk)
+    bump_version('category', instance.category_id)
+    bump_version('catalog')
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    """Take a deleted product out of its category's counters"""
+    Category.objects.filter(pk=instance.category_id).rebuild_product_counters()
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+def review_changed(sender, instance, **kwargs):
+    """Reviews are part of the product page, so they move its version"""
+    bump_version('product', instance.product_id)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def product_image_changed(sender, instance, **kwargs):
+    bump_version('product', instance.product_id)
+
+
+@receiver(post_save, sender=FAQ)
+@receiver(post_delete, sender=FAQ)
+def faq_changed(sender, instance, **kwargs):
+    """A product page shows its product's FAQs and its category's"""
+    if instance.product_id is not None:
+        bump_version('product', instance.product_id)
+    if instance.category_id is not None:
+        bump_version('category', instance.category_id)
+
+
+@receiver(post_save, sender=ExchangeRate)
+@receiver(post_delete, sender=ExchangeRate)
+def exchange_rate_changed(sender, instance, **kwargs):
+    """Other processes pick up the new rate when their cached copy expires"""
+    ExchangeRate.clear_cache()
+    bump_version('exchange_rates')
+    bump_version('catalog')
+
+
+def _reprice(product_ids):
+    Product.objects.filter(pk__in=product_ids).refresh_effective_prices()
+
+
+@receiver(pre_delete, sender=Sale)
+def sale_deleting(sender, instance, **kwargs):
+    # Its items are deleted before post_delete is sent for the sale; the
+    # instance may predate apply_due(), so is_applied is read afresh
+    instance._applied_product_ids = list(SaleItem.objects.filter(
+        sale=instance, sale__is_applied=True
+    ).values_list('product_id', flat=True))
+
+
+@receiver(post_delete, sender=Sale)
+def sale_deleted(sender, instance, **kwargs):
+    """Deleting a running sale ends its prices"""
+    if getattr(instance, '_applied_product_ids', None):
+        _reprice(instance._applied_product_ids)
+
+
+@receiver(post_delete, sender=SaleItem)
+def sale_item_deleted(sender, instance, origin=None, **kwargs):
+    """Taking a product out of a running sale ends its sale price"""
+    if isinstance(origin, Sale) or (isinstance(origin, QuerySet) and origin.model is Sale):
+        return  # Repriced by sale_deleted
+    if Sale.objects.filter(pk=instance.sale_id, is_applied=True).exists():
+        _reprice([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Wishlist.products.through)
+def wishlist_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drop the cached wishlist product ids of every affected user"""
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # instance is a product; pk_set holds wishlist ids (None on clear)
+        wishlists = Wishlist.objects.all() if pk_set is None else Wishlist.objects.filter(pk__in=pk_set)
+        user_ids = wishlists.values_list('user_id', flat=True)
+    else:
+        user_ids = [instance.user_id]
+    cache.delete_many([Wishlist.product_ids_cache_key(user_id) for user_id in user_ids])
+
+
+@receiver(post_delete, sender=Wishlist)
+def wishlist_deleted(sender, instance, **kwargs):
+    cache.delete(Wishlist.product_ids_cache_key(instance.user_id))
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, **kwargs):
+    """Keep the owner's account summary in step with their orders"""
+    if instance.user_id is None:
+        return
+    if created:
+        CustomerSummary.record_order(instance)
+    else:
+        CustomerSummary.rebuild(instance.user_id)
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    if instance.user_id is not None:
+        CustomerSummary.rebuild(instance.user_id)
@@ -0,0 +1,168 @@
+"""XML sitemaps of the catalog.
+
+sitemap.xml is an index of one sitemap of categories and one per range of
+CHUNK_SIZE product ids. A product sitemap is streamed from the database the
+first time and cached under its range's latest updated_at and product
+count, so it is only regenerated once a product in that range changes.
+"""
+import gzip
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, ExpressionWrapper, F, IntegerField, Max, Q
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from django.utils.html import escape
+from django.views.decorators.http import condition, require_GET
+
+from .models import Category, Product
+
+CHUNK_SIZE = 50000  # URLs per sitemap, the protocol's limit
+SITEMAP_CACHE_TIMEOUT = 60 * 60 * 24 * 7  # Seconds; a changed range is keyed anew sooner
+STREAM_BATCH_SIZE = 2000  # Rows read from the database, and URLs sent, at a time
+
+CONTENT_TYPE = 'application/xml; charset=utf-8'
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>\n'
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def _absolute(path):
+    return escape(settings.STORE_BASE_URL + path)
+
+
+def _url_entry(loc, lastmod):
+    lastmod = f'<lastmod>{lastmod.date().isoformat()}</lastmod>' if lastmod else ''
+    return f'<url><loc>{loc}</loc>{lastmod}</url>\n'
+
+
+def _chunk_products(number):
+    """Products with ids in the number'th range of CHUNK_SIZE ids"""
+    start = (number - 1) * CHUNK_SIZE
+    return Product.objects.filter(pk__gt=start, pk__lte=start + CHUNK_SIZE)
+
+
+def product_chunks():
+    """[(number, lastmod, active product count)] of the product ranges holding
+    active products, dated like the range's own sitemap (see _chunk_stats)"""
+    chunk = ExpressionWrapper((F('pk') - 1) / CHUNK_SIZE, output_field=IntegerField())
+    rows = Product.objects.annotate(chunk=chunk).values('chunk').annotate(
+        lastmod=Max('updated_at'), count=Count('pk', filter=Q(is_active=True))
+    ).order_by('chunk')
+    return [(row['chunk'] + 1, row['lastmod'], row['count']) for row in rows if row['count']]
+
+
+@require_GET
+def index(request):
+    """The sitemap index, listing each sitemap with its last change"""
+    chunks = product_chunks()
+    entries = [
+        (reverse('store:sitemap_categories'), max((lastmod for _, lastmod, _ in chunks), default=None))
+    ] + [
+        (reverse('store:sitemap_products', args=[number]), lastmod)
+        for number, lastmod, _ in chunks
+    ]
+    body = ''.join(
+        f'<sitemap><loc>{_absolute(path)}</loc>'
+        + (f'<lastmod>{lastmod.isoformat()}</lastmod>' if lastmod else '')
+        + '</sitemap>\n'
+        for path, lastmod in entries
+    )
+    return HttpResponse(
+        f'{XML_DECLARATION}<sitemapindex xmlns="{SITEMAP_NS}">\n{body}</sitemapindex>\n',
+        content_type=CONTENT_TYPE,
+    )
+
+
+@require_GET
+def categories(request):
+    """Sitemap of the category pages, dated by their latest product change"""
+    rows = Category.objects.annotate(
+        lastmod=Max('products__updated_at', filter=Q(products__is_active=True))
+    ).only('slug').order_by('pk').iterator(chunk_size=STREAM_BATCH_SIZE)
+    body = _url_entry(_absolute(reverse('store:category_list')), None) + ''.join(
+        _url_entry(_absolute(reverse('store:category_detail', args=[category.slug])), category.lastmod)
+        for category in rows
+    )
+    return HttpResponse(
+        f'{XML_DECLARATION}<urlset xmlns="{SITEMAP_NS}">\n{body}</urlset>\n',
+        content_type=CONTENT_TYPE,
+    )
+
+
+def _chunk_stats(request, number):
+    """Latest updated_at and active product count of a range, read once per request.
+
+    Inactive products count towards lastmod, so deactivating one dates the
+    range anew even though it drops out of the sitemap.
+    """
+    if not hasattr(request, '_sitemap_chunk'):
+        request._sitemap_chunk = _chunk_products(number).aggregate(
+            lastmod=Max('updated_at'), count=Count('pk', filter=Q(is_active=True))
+        )
+    return request._sitemap_chunk
+
+
+def _chunk_last_modified(request, number):
+    return _chunk_stats(request, number)['lastmod']
+
+
+def _product_urls(number):
+    """The product sitemap of a range, in pieces of STREAM_BATCH_SIZE URLs"""
+    # Slugs are [-a-zA-Z0-9_], so one reversed URL serves as a template for all
+    prefix, suffix = _absolute(reverse('store:product_detail', args=['slug'])).rsplit('slug', 1)
+    yield f'{XML_DECLARATION}<urlset xmlns="{SITEMAP_NS}">\n'
+    rows = _chunk_products(number).filter(is_active=True).only('slug', 'updated_at').order_by('pk')
+    batch = []
+    for product in rows.iterator(chunk_size=STREAM_BATCH_SIZE):
+        batch.append(_url_entry(f'{prefix}{product.slug}{suffix}', product.updated_at))
+        if len(batch) == STREAM_BATCH_SIZE:
+            yield ''.join(batch)
+            batch = []
+    yield ''.join(batch) + '</urlset>\n'
+
+
+def _stream_and_cache(key, pieces):
+    """Send pieces as they come, then cache the whole document gzipped"""
+    sent = []
+    for piece in pieces:
+        sent.append(piece)
+        yield piece
+    cache.set(key, gzip.compress(''.join(sent).encode()), SITEMAP_CACHE_TIMEOUT)
+
+
+@require_GET
+@condition(last_modified_func=_chunk_last_modified)
+def products(request, number):
+    """Sitemap of the products in the number'th range of CHUNK_SIZE ids.
+
+    A cached copy is served gzipped as stored to the clients that accept
+    it; an uncached one is streamed while it is read from the database.
+    """
+    stats = _chunk_stats(request, number)
+    if not stats['count']:
+        raise Http404('No products in this sitemap')
+
+    key = f"sitemap:products:{number}:{stats['lastmod'].timestamp()}:{stats['count']}"
+    content = cache.get(key)
+    if content is None:
+        return StreamingHttpResponse(
+            _stream_and_cache(key, _product_urls(number)), content_type=CONTENT_TYPE
+        )
+
+    if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = HttpResponse(content, content_type=CONTENT_TYPE)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(gzip.decompress(content), content_type=CONTENT_TYPE)
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+@require_GET
+def robots_txt(request):
+    """robots.txt pointing crawlers at the sitemap index"""
+    return HttpResponse(
+        f"User-agent: *\nAllow: /\n\nSitemap: {settings.STORE_BASE_URL}{reverse('store:sitemap')}\n",
+        content_type='text/plain; charset=utf-8',
+    )
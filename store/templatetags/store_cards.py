@@ -0,0 +1,15 @@
+from django import template
+
+from ..cards import render_product_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def product_cards(context, products, variant):
+    """Cached card HTML for each product: {% product_cards products 'product' as cards %}"""
+    request = context.get('request')
+    if getattr(request, 'page_cached', False):
+        # Shared by every anonymous visitor: main.js fills in their own token
+        return render_product_cards(products, variant)
+    return render_product_cards(products, variant, context.get('csrf_token', ''))
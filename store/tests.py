@@ -1,3 +1,1032 @@
-from django.test import TestCase
+import gzip
+import re
+import warnings
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core import mail, signing
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import search
+from .cache import bump_version, get_versions
+from .cart import COOKIE_SALT, CookieCart
+from .fuzzy import TrigramIndex
+from .listing import ProductCard
+from .models import (
+    Cart, CartItem, Category, CustomerSummary, ExchangeRate, Order, OrderItem, OutboxEmail, Product,
+    ProductRecommendation, RestockEvent, Sale, SaleItem, SalesRollup, SearchTerm, StockNotification,
+    Wishlist,
+)
+from .notifications import fan_out_restocks
+from .outbox import retry_delay, send_batch
+from .ratelimit import rejection_counts
+from .recommendations import update_recommendations
+from .reporting import period_start, update_rollups
+from .views import ORDERS_PER_PAGE
+
+
+class StoreTestCase(TestCase):
+    """Clears the caches around each test, since version counters, cached
+    pages and rate limit buckets would otherwise leak between tests"""
+
+    def setUp(self):
+        cache.clear()
+        caches['ratelimit'].clear()
+        self.addCleanup(cache.clear)
+        self.category = Category.objects.create(name='Processors', slug='processors')
+
+    def make_product(self, **fields):
+        number = Product.objects.count() + 1
+        defaults = {
+            'name': f'Product {number}',
+            'slug': f'product-{number}',
+            'description': 'A product',
+            'category': self.category,
+            'price_bdt': Decimal('1000'),
+            'brand': 'AMD',
+            'model': f'M{number}',
+            'main_image': 'products/main/product.jpg',
+            'stock_quantity': 5,
+        }
+        defaults.update(fields)
+        return Product.objects.create(**defaults)
+
+    def make_user(self, username='customer'):
+        return User.objects.create_user(username, f'{username}@example.com', 'password')
+
+    def make_order(self, items, user=None, status='pending'):
+        """An order of (product, quantity) pairs at their current prices"""
+        subtotal = sum(product.effective_price * quantity for product, quantity in items)
+        order = Order.objects.create(
+            order_number=f'PCN{Order.objects.count() + 1:06d}', user=user,
+            customer_name='Test Customer', customer_email='customer@example.com',
+            customer_phone='01700000000', division='Dhaka', district='Dhaka',
+            upazila='Gulshan', address='Road 1', subtotal=subtotal, total=subtotal,
+            status=status,
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, product_name=product.name,
+                      quantity=quantity, price=product.effective_price)
+            for product, quantity in items
+        ])
+        return order
+
+
+class ConditionalGetTests(StoreTestCase):
+    def test_unchanged_anonymous_page_is_not_modified(self):
+        self.make_product()
+        url = reverse('store:category_detail', args=[self.category.slug])
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_price_change_changes_etag(self):
+        product = self.make_product()
+        url = reverse('store:category_detail', args=[self.category.slug])
+        etag = self.client.get(url)['ETag']
+        product.price_bdt = Decimal('900')
+        product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_cart_change_changes_etag_of_signed_in_visitor(self):
+        product = self.make_product()
+        self.client.force_login(self.make_user())
+        url = reverse('store:product_list')
+        first = self.client.get(url)
+        self.assertFalse(first.has_header('Last-Modified'))
+        self.client.post(reverse('store:add_to_cart', args=[product.pk]))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_page_with_pending_messages_is_never_not_modified(self):
+        product = self.make_product()
+        self.client.force_login(self.make_user())
+        url = reverse('store:category_detail', args=[self.category.slug])
+        etag = self.client.get(url)['ETag']
+        # Queues an "added to cart" message and changes the cart
+        self.client.post(reverse('store:add_to_cart', args=[product.pk]))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class AnonymousPageCacheTests(StoreTestCase):
+    def test_repeat_anonymous_request_is_served_from_cache(self):
+        self.make_product()
+        url = reverse('store:category_detail', args=[self.category.slug])
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'miss')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'hit')
+
+    def test_category_page_depends_on_catalog_and_category(self):
+        self.make_product()
+        url = reverse('store:category_detail', args=[self.category.slug])
+        for namespace in [('catalog',), ('category', self.category.pk)]:
+            self.client.get(url)
+            bump_version(*namespace)
+            self.assertEqual(self.client.get(url)['X-Page-Cache'], 'miss', namespace)
+
+    def test_signed_in_visitors_bypass_cache(self):
+        self.make_product()
+        self.client.force_login(self.make_user())
+        url = reverse('store:category_detail', args=[self.category.slug])
+        self.client.get(url)
+        self.assertFalse(self.client.get(url).has_header('X-Page-Cache'))
+
+    def test_cached_page_leaves_cart_badge_to_session_fragments(self):
+        product = self.make_product()
+        self.client.post(reverse('store:add_to_cart', args=[product.pk]))
+        response = self.client.get(reverse('store:session_fragments'))
+        self.assertEqual(response.json()['cart_items_count'], 1)
+
+    def test_anonymous_visitors_do_not_share_csrf_tokens(self):
+        self.make_product()
+        url = reverse('store:category_detail', args=[self.category.slug])
+        first, second = Client(), Client()
+        first.cookies['csrftoken'] = 'A' * 32
+        second.cookies['csrftoken'] = 'B' * 32
+        self.assertEqual(first.get(url)['X-Page-Cache'], 'miss')
+        response = second.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        tokens = re.findall(r'name="csrfmiddlewaretoken" value="([^"]*)"', response.content.decode())
+        self.assertTrue(tokens)
+        self.assertEqual(set(tokens), {''})
+
+
+class AsyncViewTests(StoreTestCase):
+    def test_product_detail_shows_product_and_related_products(self):
+        product = self.make_product(name='Ryzen 7 7700X')
+        self.make_product(name='Ryzen 5 7600')
+        response = self.client.get(reverse('store:product_detail', args=[product.slug]))
+        self.assertContains(response, 'Ryzen 7 7700X')
+        self.assertContains(response, 'Ryzen 5 7600')
+
+    def test_missing_or_inactive_product_is_not_found(self):
+        product = self.make_product(is_active=False)
+        self.assertEqual(self.client.get(reverse('store:product_detail', args=['missing'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('store:product_detail', args=[product.slug])).status_code, 404)
+
+    async def test_home_under_asgi(self):
+        product = await Product.objects.acreate(
+            name='Featured GPU', slug='featured-gpu', description='A product',
+            category=self.category, price_bdt=Decimal('50000'), brand='ASUS', model='G1',
+            main_image='products/main/product.jpg', is_featured=True,
+        )
+        response = await self.async_client.get(reverse('store:home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['featured_products']), [product])
+
+    def test_account_requires_login(self):
+        url = reverse('store:account')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.make_user())
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class EffectivePriceTests(StoreTestCase):
+    PRICES = [
+        (Decimal('10199'), 15),
+        (Decimal('10.10'), 15),  # Half a paisa, rounded up
+        (Decimal('999.99'), 33),
+        (Decimal('45000'), 0),
+        (Decimal('1'), 99),
+    ]
+
+    def test_discount_is_applied_on_save(self):
+        product = self.make_product(price_bdt=Decimal('10199'), discount_percentage=15)
+        self.assertEqual(product.effective_price, Decimal('8669.15'))
+        product.refresh_from_db()
+        self.assertEqual(product.effective_price, Decimal('8669.15'))
+
+    def test_bulk_refresh_matches_save(self):
+        products = [
+            self.make_product(price_bdt=price, discount_percentage=discount)
+            for price, discount in self.PRICES
+        ]
+        saved = {product.pk: Product.objects.get(pk=product.pk).effective_price for product in products}
+        Product.objects.update(effective_price=0)
+        Product.objects.refresh_effective_prices()
+        refreshed = dict(Product.objects.values_list('pk', 'effective_price'))
+        self.assertEqual(refreshed, saved)
+        self.assertEqual(saved[products[1].pk], Decimal('8.59'))
+
+    def test_product_list_sorts_and_filters_on_discounted_price(self):
+        cheap = self.make_product(price_bdt=Decimal('2000'), discount_percentage=60)
+        dear = self.make_product(price_bdt=Decimal('1000'))
+        response = self.client.get(reverse('store:product_list'), {'sort': 'price_low'})
+        self.assertEqual([row.pk for row in response.context['products']], [cheap.pk, dear.pk])
+        response = self.client.get(reverse('store:product_list'), {'max_price': '900'})
+        self.assertEqual([row.pk for row in response.context['products']], [cheap.pk])
+
+
+class ExchangeRateTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        ExchangeRate.clear_cache()
+        self.addCleanup(ExchangeRate.clear_cache)
+
+    @override_settings(EXCHANGE_RATE_FALLBACKS={'USD': 110})
+    def test_whole_fallback_rate_keeps_fractions(self):
+        product = self.make_product(price_bdt=Decimal('10000'))
+        converted = Product.objects.with_converted_price('USD').get(pk=product.pk).converted_price
+        self.assertEqual(converted, Decimal('90.91'))
+
+    def test_latest_effective_rate_is_used(self):
+        ExchangeRate.objects.create(currency='USD', rate=Decimal('100'), effective_from=timezone.now() - timedelta(days=2))
+        ExchangeRate.objects.create(currency='USD', rate=Decimal('125'), effective_from=timezone.now() - timedelta(days=1))
+        ExchangeRate.objects.create(currency='USD', rate=Decimal('150'), effective_from=timezone.now() + timedelta(days=1))
+        self.assertEqual(ExchangeRate.get_rate('USD'), Decimal('125'))
+        product = self.make_product(price_bdt=Decimal('1000'))
+        converted = Product.objects.with_converted_price('USD').get(pk=product.pk).converted_price
+        self.assertEqual(converted, Decimal('8.00'))
+
+    def test_saving_a_rate_clears_the_process_cache(self):
+        ExchangeRate.objects.create(currency='EUR', rate=Decimal('130'), effective_from=timezone.now() - timedelta(hours=1))
+        self.assertEqual(ExchangeRate.get_rate('EUR'), Decimal('130'))
+        ExchangeRate.objects.create(currency='EUR', rate=Decimal('135'), effective_from=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(ExchangeRate.get_rate('EUR'), Decimal('135'))
+
+    def test_scheduled_rate_reprices_cached_pages(self):
+        now = timezone.now()
+        ExchangeRate.objects.create(currency='USD', rate=Decimal('100'), effective_from=now - timedelta(days=1))
+        ExchangeRate.objects.create(currency='USD', rate=Decimal('125'), effective_from=now + timedelta(hours=1))
+        product = self.make_product(price_bdt=Decimal('1000'))
+        signed_in = Client()
+        signed_in.force_login(self.make_user())
+        urls = [
+            reverse('store:category_detail', args=[self.category.slug]),
+            reverse('store:product_detail', args=[product.slug]),
+        ]
+        for client in (self.client, signed_in):
+            for url in urls:
+                self.assertContains(client.get(url), '10.00 USD')
+
+        # Nothing is saved when the scheduled rate takes effect
+        with mock.patch('django.utils.timezone.now', return_value=now + timedelta(hours=2)):
+            for client in (self.client, signed_in):
+                for url in urls:
+                    response = client.get(url)
+                    self.assertContains(response, '8.00 USD')
+                    self.assertNotContains(response, '10.00 USD')
+
+    @override_settings(EXCHANGE_RATE_FALLBACKS={})
+    def test_unknown_currency_is_rejected(self):
+        self.assertIsNone(ExchangeRate.get_rate('JPY'))
+        with self.assertRaises(ValueError):
+            Product.objects.with_converted_price('JPY')
+
+
+class SaleTests(StoreTestCase):
+    def make_sale(self, products, sale_price, **fields):
+        now = timezone.now()
+        fields.setdefault('starts_at', now - timedelta(hours=1))
+        fields.setdefault('ends_at', now + timedelta(hours=1))
+        sale = Sale.objects.create(name='Flash sale', **fields)
+        for product in products:
+            SaleItem.objects.create(sale=sale, product=product, sale_price=sale_price)
+        return sale
+
+    def price(self, product):
+        return Product.objects.values_list('effective_price', flat=True).get(pk=product.pk)
+
+    def test_deals_rank_biggest_discount_first(self):
+        big = self.make_product(price_bdt=Decimal('10000'), discount_percentage=50)
+        small = self.make_product(price_bdt=Decimal('10000'), discount_percentage=10)
+        self.make_product(price_bdt=Decimal('10000'))
+        response = self.client.get(reverse('store:deals'))
+        self.assertEqual([row.pk for row in response.context['discounted_products']], [big.pk, small.pk])
+
+    def test_sale_prices_apply_while_the_sale_runs(self):
+        product = self.make_product(price_bdt=Decimal('10000'))
+        sale = self.make_sale([product], Decimal('7999'))
+        self.assertEqual(Sale.apply_due(), (1, 0, 1))
+        self.assertEqual(self.price(product), Decimal('7999'))
+
+        Sale.apply_due(now=sale.ends_at)
+        self.assertEqual(self.price(product), Decimal('10000'))
+
+    def test_deleting_a_running_sale_restores_prices(self):
+        product = self.make_product(price_bdt=Decimal('10000'), discount_percentage=10)
+        sale = self.make_sale([product], Decimal('7999'))
+        Sale.apply_due()
+        sale.delete()
+        self.assertEqual(self.price(product), Decimal('9000'))
+
+    def test_removing_a_product_from_a_running_sale_restores_its_price(self):
+        product, other = self.make_product(price_bdt=Decimal('10000')), self.make_product(price_bdt=Decimal('10000'))
+        sale = self.make_sale([product, other], Decimal('7999'))
+        Sale.apply_due()
+        sale.items.get(product=product).delete()
+        self.assertEqual(self.price(product), Decimal('10000'))
+        self.assertEqual(self.price(other), Decimal('7999'))
+
+
+class RecommendationTests(StoreTestCase):
+    def test_most_often_bought_together_ranks_first(self):
+        cpu, board, cooler, case = (self.make_product() for _ in range(4))
+        self.make_order([(cpu, 1), (board, 1)])
+        self.make_order([(cpu, 1), (cooler, 1)])
+        self.make_order([(cpu, 1), (cooler, 1)])
+        self.make_order([(cpu, 1), (case, 1)], status='cancelled')
+        self.assertEqual(update_recommendations(), (3, 3))
+        self.assertEqual(
+            list(ProductRecommendation.objects.filter(product=cpu).values_list('recommended_id', 'score')),
+            [(cooler.pk, 2), (board.pk, 1)],
+        )
+
+    def test_later_runs_only_add_new_orders(self):
+        cpu, board = self.make_product(), self.make_product()
+        self.make_order([(cpu, 1), (board, 1)])
+        update_recommendations()
+        self.assertEqual(update_recommendations(), (0, 0))
+        self.make_order([(cpu, 1), (board, 2)])
+        update_recommendations()
+        self.assertEqual(ProductRecommendation.objects.get(product=cpu).score, 2)
+
+    def test_product_page_shows_recommendations(self):
+        other_category = Category.objects.create(name='Coolers', slug='coolers')
+        cpu = self.make_product()
+        cooler = self.make_product(name='Tower Cooler', category=other_category)
+        self.make_order([(cpu, 1), (cooler, 1)])
+        update_recommendations()
+        response = self.client.get(reverse('store:product_detail', args=[cpu.slug]))
+        self.assertEqual(response.context['related_products'], [cooler])
+
+
+class WishlistTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user()
+        self.client.force_login(self.user)
+
+    def test_toggle_adds_then_removes(self):
+        product = self.make_product()
+        url = reverse('store:api_toggle_wishlist')
+        data = self.client.post(url, {'product_id': product.pk}, content_type='application/json').json()
+        self.assertTrue(data['in_wishlist'])
+        self.assertEqual(data['wishlist']['product_ids'], [product.pk])
+        data = self.client.post(url, {'product_id': product.pk}).json()
+        self.assertFalse(data['in_wishlist'])
+        self.assertEqual(data['wishlist_count'], 0)
+
+    def test_membership_of_a_page_in_one_cached_query(self):
+        wished, other = self.make_product(), self.make_product()
+        Wishlist.objects.create(user=self.user).products.add(wished)
+        url = reverse('store:api_wishlist_membership') + f'?ids={wished.pk},{other.pk}'
+        self.assertEqual(self.client.get(url).json(), {'product_ids': [wished.pk]})
+        with self.assertNumQueries(0):
+            self.assertEqual(Wishlist.get_product_ids(self.user), {wished.pk})
+
+    def test_cached_ids_follow_changes(self):
+        product = self.make_product()
+        wishlist = Wishlist.objects.create(user=self.user)
+        self.assertEqual(Wishlist.get_product_ids(self.user), set())
+        wishlist.products.add(product)
+        self.assertEqual(Wishlist.get_product_ids(self.user), {product.pk})
+        self.client.post(reverse('store:api_remove_from_wishlist'), {'product_id': product.pk})
+        self.assertEqual(Wishlist.get_product_ids(self.user), set())
+
+    def test_anonymous_visitors_must_log_in(self):
+        self.client.logout()
+        response = self.client.post(reverse('store:api_add_to_wishlist'), {'product_id': self.make_product().pk})
+        self.assertEqual(response.status_code, 401)
+
+
+class CartMergeTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user()
+        self.cart = Cart.objects.create(user=self.user)
+
+    def quantities(self):
+        return dict(self.cart.items.values_list('product_id', 'quantity'))
+
+    def test_merge_sums_and_caps_at_stock(self):
+        owned, new, scarce, sold_out = (self.make_product(stock_quantity=stock) for stock in (5, 5, 2, 0))
+        CartItem.objects.create(cart=self.cart, product=owned, quantity=2)
+        self.cart.merge_quantities({owned.pk: 2, new.pk: 1, scarce.pk: 3, sold_out.pk: 1, 0: 1})
+        self.assertEqual(self.quantities(), {owned.pk: 4, new.pk: 1, scarce.pk: 2})
+
+    def test_merge_query_count_does_not_grow_with_the_cart(self):
+        small = {self.make_product().pk: 1 for _ in range(2)}
+        large = {self.make_product().pk: 1 for _ in range(20)}
+        CartItem.objects.create(cart=self.cart, product_id=next(iter(small)), quantity=1)
+        CartItem.objects.create(cart=self.cart, product_id=next(iter(large)), quantity=1)
+        with CaptureQueriesContext(connection) as small_queries:
+            self.cart.merge_quantities(small)
+        with self.assertNumQueries(len(small_queries)):
+            self.cart.merge_quantities(large)
+
+    def test_login_merges_the_anonymous_cart(self):
+        product = self.make_product()
+        self.client.post(reverse('store:add_to_cart', args=[product.pk]), {'quantity': 2})
+        self.client.post(reverse('store:login'), {'username': 'customer', 'password': 'password'})
+        self.assertEqual(self.quantities(), {product.pk: 2})
+        self.assertEqual(Cart.objects.count(), 1)
+        self.assertFalse(self.client.cookies['cart'].value)
+
+
+class CookieCartTests(StoreTestCase):
+    def test_anonymous_cart_lives_in_the_cookie(self):
+        product = self.make_product()
+        self.client.get(reverse('store:cart'))
+        self.client.post(reverse('store:add_to_cart', args=[product.pk]), {'quantity': 3})
+        response = self.client.get(reverse('store:cart'))
+        self.assertEqual(response.context['cart'].total_items, 3)
+        self.assertContains(response, product.name)
+        self.assertFalse(Cart.objects.exists())
+        self.assertNotIn('cart_id', self.client.session)
+
+    def test_tampered_cookie_is_an_empty_cart(self):
+        product = self.make_product()
+        self.client.post(reverse('store:add_to_cart', args=[product.pk]))
+        self.client.cookies['cart'] = self.client.cookies['cart'].value.replace(f'{product.pk}:1', f'{product.pk}:9')
+        self.assertEqual(self.client.get(reverse('store:cart')).context['cart'].total_items, 0)
+
+    @override_settings(STORE_CART_MAX_LINES=1)
+    def test_a_full_cookie_cart_takes_no_new_lines(self):
+        first, second = self.make_product(), self.make_product()
+        self.client.post(reverse('store:add_to_cart', args=[first.pk]))
+        self.client.post(reverse('store:add_to_cart', args=[second.pk]))
+        self.client.post(reverse('store:add_to_cart', args=[first.pk]))
+        self.assertEqual(CookieCart.decode(signing.get_cookie_signer(salt='cart' + COOKIE_SALT).unsign(
+            self.client.cookies['cart'].value
+        )), {first.pk: 2})
+
+
+class PurgeStaleDataTests(StoreTestCase):
+    def test_purges_expired_sessions_and_abandoned_carts(self):
+        now = timezone.now()
+        Session.objects.create(session_key='expired', session_data='', expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key='live', session_data='', expire_date=now + timedelta(days=1))
+        product = self.make_product()
+        anonymous_old = Cart.objects.create()
+        CartItem.objects.create(cart=anonymous_old, product=product)
+        anonymous_recent = Cart.objects.create()
+        Cart.objects.create(user=self.make_user('empty'))
+        full_user_cart = Cart.objects.create(user=self.make_user('full'))
+        CartItem.objects.create(cart=full_user_cart, product=product)
+        Cart.objects.exclude(pk=anonymous_recent.pk).update(updated_at=now - timedelta(days=31))
+
+        output = StringIO()
+        call_command('purge_stale_data', days=30, batch_size=1, pause=0, stdout=output)
+
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+        self.assertEqual(set(Cart.objects.all()), {anonymous_recent, full_user_cart})
+        self.assertEqual(CartItem.objects.get().cart, full_user_cart)
+        self.assertIn('Carts: deleted 3 row(s)', output.getvalue())
+
+
+class OrderHistoryTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user()
+        self.client.force_login(self.user)
+
+    def test_summary_follows_orders(self):
+        product = self.make_product(price_bdt=Decimal('1000'))
+        first = self.make_order([(product, 1)], user=self.user)
+        last = self.make_order([(product, 2)], user=self.user)
+        summary = CustomerSummary.objects.get(user=self.user)
+        self.assertEqual((summary.order_count, summary.lifetime_spend, summary.last_order), (2, Decimal('3000'), last))
+
+        first.status = 'cancelled'
+        first.save()
+        summary.refresh_from_db()
+        self.assertEqual((summary.order_count, summary.active_order_count, summary.lifetime_spend), (2, 1, Decimal('2000')))
+        self.assertEqual(self.client.get(reverse('store:account')).context['summary'], summary)
+
+    def test_history_pages_by_cursor_in_constant_queries(self):
+        product = self.make_product()
+        orders = [self.make_order([(product, 1)], user=self.user) for _ in range(ORDERS_PER_PAGE + 2)]
+        url = reverse('store:order_history')
+        response = self.client.get(url)
+        first_page = response.context['orders']
+        self.assertEqual(first_page, orders[::-1][:ORDERS_PER_PAGE])
+        self.assertIsNone(response.context['newer_cursor'])
+
+        response = self.client.get(url, {'before': response.context['older_cursor']})
+        self.assertEqual(response.context['orders'], orders[1::-1])
+        self.assertIsNone(response.context['older_cursor'])
+        response = self.client.get(url, {'after': response.context['newer_cursor']})
+        self.assertEqual(response.context['orders'], first_page)
+
+    def test_history_items_are_prefetched(self):
+        products = [self.make_product() for _ in range(3)]
+        for _ in range(ORDERS_PER_PAGE):
+            self.make_order([(product, 1) for product in products], user=self.user)
+        # Session, user, orders, items with their products, cart and wishlist counts
+        with self.assertNumQueries(6):
+            self.client.get(reverse('store:order_history'))
+
+
+class SalesRollupTests(StoreTestCase):
+    def rollup(self, period, dimension, key=''):
+        row = SalesRollup.objects.get(
+            period=period, period_start=period_start(timezone.localdate(), period), dimension=dimension, key=key
+        )
+        return row.order_count, row.units, row.revenue
+
+    def test_rollups_follow_new_and_changed_orders(self):
+        cpu = self.make_product(price_bdt=Decimal('1000'))
+        self.make_order([(cpu, 2)])
+        cancelled = self.make_order([(cpu, 1)])
+        cancelled.status = 'cancelled'
+        cancelled.save()
+        self.assertEqual(update_rollups(), 1)
+
+        for period in ('day', 'week', 'month'):
+            self.assertEqual(self.rollup(period, 'total'), (1, 2, Decimal('2000')))
+        self.assertEqual(self.rollup('day', 'payment_method', 'cod'), (1, 2, Decimal('2000')))
+        self.assertEqual(self.rollup('day', 'status', 'cancelled'), (1, 1, Decimal('1000')))
+        self.assertEqual(self.rollup('day', 'product', str(cpu.pk)), (1, 2, Decimal('2000')))
+        self.assertEqual(self.rollup('day', 'category', str(self.category.pk)), (1, 2, Decimal('2000')))
+
+        cancelled.status = 'pending'
+        cancelled.save()
+        update_rollups()
+        self.assertEqual(self.rollup('month', 'total'), (2, 3, Decimal('3000')))
+        self.assertFalse(SalesRollup.objects.filter(dimension='status', key='cancelled').exists())
+
+    def test_dashboard_is_for_staff(self):
+        self.make_order([(self.make_product(), 1)])
+        update_rollups()
+        url = reverse('store:sales_dashboard')
+        user = self.make_user()
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(url).status_code, 302)
+        user.is_staff = True
+        user.save()
+        response = self.client.get(url, {'period': 'week'})
+        self.assertEqual([row.order_count for row in response.context['periods']], [1])
+
+
+class FailingConnection:
+    """Email backend stand-in whose server is down"""
+
+    def open(self):
+        raise ConnectionRefusedError('Connection refused')
+
+    def close(self):
+        pass
+
+
+class OutboxTests(StoreTestCase):
+    def test_checkout_queues_the_confirmation_instead_of_sending_it(self):
+        user = self.make_user()
+        CartItem.objects.create(cart=Cart.objects.create(user=user), product=self.make_product())
+        self.client.force_login(user)
+        self.client.post(reverse('store:checkout'), {
+            'customer_name': 'Test Customer', 'customer_email': 'customer@example.com',
+            'customer_phone': '01700000000', 'payment_method': 'cod',
+            'division': 'dhaka', 'district': 'Dhaka', 'upazila': 'Gulshan', 'address': 'Road 1',
+        })
+        order = Order.objects.get()
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.recipients, ['customer@example.com'])
+        self.assertIn(order.order_number, email.subject)
+        self.assertEqual(mail.outbox, [])
+
+    def test_send_batch_sends_due_emails_over_one_connection(self):
+        OutboxEmail.objects.create(to='a@example.com', subject='First', body='')
+        OutboxEmail.objects.create(to='b@example.com', subject='Later', body='',
+                                   send_after=timezone.now() + timedelta(hours=1))
+        self.assertEqual(send_batch(mail.get_connection()), (1, 0))
+        self.assertEqual([message.subject for message in mail.outbox], ['First'])
+        self.assertEqual(send_batch(mail.get_connection()), (0, 0))
+
+    @override_settings(OUTBOX_RETRY_DELAY=60, OUTBOX_MAX_RETRY_DELAY=100, OUTBOX_MAX_ATTEMPTS=3)
+    def test_failures_back_off_and_give_up(self):
+        email = OutboxEmail.objects.create(to='a@example.com', subject='First', body='')
+        self.assertEqual(send_batch(FailingConnection()), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('ConnectionRefusedError', email.last_error)
+        self.assertGreater(email.send_after, timezone.now() + timedelta(seconds=55))
+        self.assertEqual([retry_delay(attempts).seconds for attempts in (1, 2, 3)], [60, 100, 100])
+
+        OutboxEmail.objects.update(send_after=timezone.now(), attempts=3)
+        self.assertEqual(send_batch(mail.get_connection()), (0, 0))
+
+
+class BackInStockTests(StoreTestCase):
+    def subscribe(self, product, email):
+        return self.client.post('/api/request-notification/', {'product_id': product.pk, 'email': email},
+                                content_type='application/json')
+
+    def test_only_out_of_stock_products_take_subscriptions(self):
+        self.assertEqual(self.subscribe(self.make_product(), 'a@example.com').status_code, 400)
+        sold_out = self.make_product(stock_quantity=0)
+        self.assertTrue(self.subscribe(sold_out, 'A@example.com').json()['success'])
+        self.subscribe(sold_out, 'a@example.com')
+        self.assertEqual(list(StockNotification.objects.values_list('email', flat=True)), ['a@example.com'])
+
+    def test_restocking_by_save_or_bulk_update_queues_emails_later(self):
+        saved, updated, unwatched = (self.make_product(stock_quantity=0) for _ in range(3))
+        for email in ('a@example.com', 'b@example.com', 'c@example.com'):
+            self.subscribe(saved, email)
+        self.subscribe(updated, 'a@example.com')
+
+        saved.stock_quantity = 3
+        saved.save()
+        Product.objects.filter(pk__in=[updated.pk, unwatched.pk]).update(stock_quantity=1)
+        self.assertEqual(set(RestockEvent.objects.values_list('product_id', flat=True)), {saved.pk, updated.pk})
+        self.assertFalse(OutboxEmail.objects.exists())
+
+        self.assertEqual(fan_out_restocks(batch_size=2), (2, 4))
+        self.assertEqual(OutboxEmail.objects.filter(subject__contains=saved.name).count(), 3)
+        self.assertFalse(StockNotification.objects.filter(notified_at__isnull=True).exists())
+        self.assertEqual(fan_out_restocks(), (0, 0))
+
+
+class StorefrontApiTests(StoreTestCase):
+    def test_batch_fetch_keeps_the_requested_order_in_one_query(self):
+        first, second = self.make_product(name='First'), self.make_product(name='Second')
+        url = reverse('store:api_products')
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'ids': f'{second.pk},0,{first.pk}', 'fields': 'name,price'})
+        self.assertEqual(response.json(), {'products': [
+            {'name': 'Second', 'price': '1000.00'}, {'name': 'First', 'price': '1000.00'},
+        ]})
+        self.assertEqual(self.client.get(url, {'ids': first.pk, 'fields': 'name,secret'}).status_code, 400)
+
+    def test_listing_pages_by_cursor(self):
+        products = [self.make_product() for _ in range(3)]
+        url = reverse('store:api_products')
+        page = self.client.get(url, {'category': self.category.slug, 'limit': 2, 'fields': 'slug'}).json()
+        self.assertEqual(page, {'products': [{'slug': products[0].slug}, {'slug': products[1].slug}],
+                                'next': products[1].pk})
+        page = self.client.get(url, {'after': page['next'], 'fields': 'id'}).json()
+        self.assertEqual(page, {'products': [{'id': products[2].pk}], 'next': None})
+
+    def test_json_bodies_that_are_not_objects_are_rejected(self):
+        self.client.force_login(self.make_user())
+        for url in ('/api/add-to-cart/', reverse('store:api_cart_update'), reverse('store:api_cart_remove'),
+                    reverse('store:api_toggle_wishlist'), '/api/request-notification/'):
+            for body in ('[1]', '"x"', '1', 'null', '{'):
+                response = self.client.post(url, body, content_type='application/json')
+                self.assertEqual(response.status_code, 400, (url, body))
+                self.assertFalse(response.json()['success'])
+
+    def test_cart_mutations_return_the_cart(self):
+        product = self.make_product(stock_quantity=3)
+        data = self.client.post(reverse('store:api_cart_add'), {'product_id': product.pk, 'quantity': 2},
+                                content_type='application/json').json()
+        self.assertEqual((data['cart']['total_items'], data['cart']['subtotal']), (2, '2000.00'))
+        response = self.client.post(reverse('store:api_cart_update'), {'product_id': product.pk, 'quantity': 4})
+        self.assertEqual(response.status_code, 400)
+        data = self.client.post(reverse('store:api_cart_remove'), {'product_id': product.pk}).json()
+        self.assertEqual(data['cart']['items'], [])
+
+
+class CategoryColumnsTests(StoreTestCase):
+    def test_columns_are_cached_per_category_version(self):
+        first = self.make_product(name='First', price_bdt=Decimal('1500'))
+        self.make_product(name='Hidden', is_active=False)
+        url = reverse('store:api_category_products', args=[self.category.slug])
+        response = self.client.get(url)
+        data = response.json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual((data['columns']['name'], data['columns']['price']), (['First'], [1500.0]))
+
+        # Only the ETag's category lookup is left once the payload is cached
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+        first.name = 'Renamed'
+        first.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.json()['columns']['name'], ['Renamed'])
+
+    def test_unknown_category(self):
+        self.assertEqual(self.client.get(reverse('store:api_category_products', args=['missing'])).status_code, 404)
+
+
+class BulkUpdateTests(StoreTestCase):
+    def test_bulk_update_touches_products(self):
+        product = self.make_product()
+        Product.objects.filter(pk=product.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        before = Product.objects.get(pk=product.pk).updated_at
+        Product.objects.filter(pk=product.pk).update(name='Renamed')
+        self.assertGreater(Product.objects.get(pk=product.pk).updated_at, before)
+
+    def test_bulk_update_refreshes_cached_cards(self):
+        product = self.make_product(name='Old Name')
+        self.client.force_login(self.make_user())
+        url = reverse('store:category_detail', args=[self.category.slug])
+        self.assertContains(self.client.get(url), 'Old Name')
+        Product.objects.filter(pk=product.pk).update(name='New Name')
+        self.assertContains(self.client.get(url), 'New Name')
+
+    def test_repricing_refreshes_cached_pages(self):
+        product = self.make_product(price_bdt=Decimal('1000'))
+        url = reverse('store:category_detail', args=[self.category.slug])
+        self.assertContains(self.client.get(url), '1,000')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'hit')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=product.pk).update(discount_percentage=10)
+            Product.objects.filter(pk=product.pk).refresh_effective_prices()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, '900')
+
+    def test_moving_products_invalidates_the_new_category(self):
+        other = Category.objects.create(name='Coolers', slug='coolers')
+        product = self.make_product(name='Tower Cooler')
+        url = reverse('store:category_detail', args=[other.slug])
+        self.assertNotContains(self.client.get(url), 'Tower Cooler')
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=product.pk).update(category=other)
+        self.assertContains(self.client.get(url), 'Tower Cooler')
+
+    def test_versions_move_once_the_update_commits(self):
+        product = self.make_product()
+        namespaces = [('product', product.pk), ('category', self.category.pk), ('catalog',)]
+        before = get_versions(namespaces)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=product.pk).update(name='Renamed')
+            self.assertEqual(get_versions(namespaces), before)
+        self.assertTrue(all(new > old for new, old in zip(get_versions(namespaces), before)))
+
+    @mock.patch('store.models.PRODUCT_VERSION_BUMP_LIMIT', 1)
+    def test_large_updates_move_only_category_versions(self):
+        products = [self.make_product() for _ in range(2)]
+        other = Category.objects.create(name='Coolers', slug='coolers')
+        product_namespaces = [('product', product.pk) for product in products]
+        namespaces = [('category', self.category.pk), ('category', other.pk), ('catalog',)]
+        product_versions, versions = get_versions(product_namespaces), get_versions(namespaces)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(category=self.category).update(category=other)
+        self.assertEqual(get_versions(product_namespaces), product_versions)
+        self.assertTrue(all(new > old for new, old in zip(get_versions(namespaces), versions)))
+
+
+class SearchTermTests(StoreTestCase):
+    def counts(self):
+        return dict(SearchTerm.objects.values_list('query', 'count'))
+
+    def test_searches_are_counted_without_database_writes(self):
+        self.make_product(name='Ryzen 5 7600')
+        url = reverse('store:product_search')
+        for query in ('ryzen', 'Ryzen', 'rtx'):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url, {'q': query})
+            self.assertFalse([sql for sql in queries.captured_queries if 'store_searchterm' in sql['sql']])
+        self.assertEqual(self.counts(), {})
+
+        output = StringIO()
+        call_command('prewarm_search', stdout=output)
+        self.assertEqual(self.counts(), {'ryzen': 2, 'rtx': 1})
+        self.assertIn('2 search term count(s) saved', output.getvalue())
+
+    def test_out_of_range_prices_are_ignored(self):
+        url = reverse('store:product_search')
+        for price in ('1e1000000', '1e100000', '100000000', 'NaN'):
+            response = self.client.get(url, {'q': 'x', 'min_price': price})
+            self.assertEqual(response.status_code, 200, price)
+            self.assertNotIn('min_price', search.normalize_filters({'min_price': price}), price)
+        self.assertEqual(search.normalize_filters({'max_price': '১২,৫০০.০'})['max_price'], '12500')
+        self.assertEqual(search.normalize_filters({'max_price': '1e-100000'})['max_price'], '0')
+
+    def test_flushes_add_up(self):
+        SearchTerm.record('ssd')
+        self.assertEqual(SearchTerm.flush_counts(), 1)
+        self.assertEqual(SearchTerm.flush_counts(), 0)
+        SearchTerm.record('ssd')
+        SearchTerm.record('ram')
+        SearchTerm.flush_counts()
+        self.assertEqual(self.counts(), {'ssd': 2, 'ram': 1})
+
+
+class FuzzySearchTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        search._fuzzy_index = None  # Built per process, so it would outlive the test's products
+
+    def search(self, query):
+        response = self.client.get(reverse('store:product_search'), {'q': query})
+        return [product.name for product in response.context['products']], response.context['fuzzy']
+
+    def test_trigram_index_ranks_closest_words_first(self):
+        index = TrigramIndex([(1, ['ryzen', '5600']), (2, ['ryzen', '7600']), (3, ['intel', 'core'])])
+        self.assertEqual(index.search(['ryzn', '5600']), [1, 2])
+        self.assertEqual(index.search(['xyz']), [])
+
+    def test_misspelled_queries_fall_back_to_similar_products(self):
+        self.make_product(name='AMD Ryzen 5 5600', brand='AMD')
+        self.make_product(name='Intel Core i5 12400F', brand='Intel')
+        self.assertEqual(self.search('ryzen 5600'), (['AMD Ryzen 5 5600'], False))
+        self.assertEqual(self.search('ryzn 5600'), (['AMD Ryzen 5 5600'], True))
+        self.assertEqual(self.search('রাইজেন ৫৬০০'), (['AMD Ryzen 5 5600'], True))
+        self.assertEqual(self.search('qwxz'), ([], False))
+
+    def test_bangla_shop_words_are_translated(self):
+        self.assertEqual(search.normalize_query('ল্যাপটপ এর দাম কত'), 'laptop')
+        self.assertEqual(search.normalize_query('১৬ জিবি'), '16gb')
+
+
+@override_settings(STORE_RATE_LIMITS={
+    'store.views.user_login': (1, 1, 60, ['POST']),
+    'store.views.product_search': (1, 1, 60),
+})
+class RateLimitTests(StoreTestCase):
+    def test_login_form_views_are_not_limited(self):
+        url = reverse('store:login')
+        for _ in range(3):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        credentials = {'username': 'nobody', 'password': 'wrong'}
+        self.assertEqual(self.client.post(url, credentials).status_code, 200)
+        response = self.client.post(url, credentials)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+
+    def test_views_without_methods_are_limited_on_every_method(self):
+        url = reverse('store:product_search')
+        self.assertEqual(self.client.get(url, {'q': 'ryzen'}).status_code, 200)
+        self.assertEqual(self.client.get(url, {'q': 'ryzen'}).status_code, 429)
+        self.assertEqual(rejection_counts(), {'store.views.user_login': 0, 'store.views.product_search': 1})
+
+
+class SitemapTests(StoreTestCase):
+    def test_index_lists_the_product_ranges(self):
+        self.make_product()
+        content = self.client.get(reverse('store:sitemap')).content.decode()
+        self.assertIn('<loc>https://pcnexus.com.bd/sitemap-categories.xml</loc>', content)
+        self.assertIn('<loc>https://pcnexus.com.bd/sitemap-products-1.xml</loc>', content)
+        self.assertNotIn('sitemap-products-2.xml', content)
+
+    def test_product_sitemap_is_streamed_then_served_from_the_cache(self):
+        listed = self.make_product()
+        hidden = self.make_product(is_active=False)
+        url = reverse('store:sitemap_products', args=[1])
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn(f'/products/{listed.slug}/', content)
+        self.assertNotIn(hidden.slug, content)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content).decode(), content)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        listed.name = 'Renamed'
+        listed.slug = 'renamed'
+        listed.save()
+        response = self.client.get(url)
+        self.assertIn('/products/renamed/', b''.join(response.streaming_content).decode())
+
+    def test_empty_range_is_not_found(self):
+        self.make_product(is_active=False)
+        self.assertEqual(self.client.get(reverse('store:sitemap_products', args=[1])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('store:sitemap_products', args=[2])).status_code, 404)
+
+
+class ProductDetailBundleTests(StoreTestCase):
+    def test_bulk_updates_reach_the_cached_product_page(self):
+        product = self.make_product(name='Old Name', price_bdt=Decimal('1000'))
+        url = reverse('store:product_detail', args=[product.slug])
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'hit')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=product.pk).update(name='New Name', discount_percentage=10)
+            Product.objects.filter(pk=product.pk).refresh_effective_prices()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'New Name')
+        self.assertEqual(response.context['product'].effective_price, Decimal('900'))
+
+        # Logged in visitors get the page from the bundle alone
+        self.client.force_login(self.make_user())
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=product.pk).update(name='Newest Name')
+        self.assertContains(self.client.get(url), 'Newest Name')
+
+    def test_cached_product_page_keeps_the_catalog_dependency(self):
+        product = self.make_product()
+        url = reverse('store:product_detail', args=[product.slug])
+        self.client.get(url)
+        bump_version('catalog')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'miss')
+
+    def test_bundle_follows_related_products_from_other_categories(self):
+        other_category = Category.objects.create(name='Coolers', slug='coolers')
+        cpu = self.make_product()
+        cooler = self.make_product(name='Tower Cooler', category=other_category)
+        self.make_order([(cpu, 1), (cooler, 1)])
+        update_recommendations()
+        self.client.force_login(self.make_user())
+        url = reverse('store:product_detail', args=[cpu.slug])
+        self.assertContains(self.client.get(url), 'Tower Cooler')
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=cooler.pk).update(name='Liquid Cooler')
+        self.assertContains(self.client.get(url), 'Liquid Cooler')
+
+
+class ProductCardTests(StoreTestCase):
+    def test_cards_read_like_products(self):
+        product = self.make_product(name='Ryzen 5', stock_quantity=3, discount_percentage=10)
+        card = Product.objects.filter(pk=product.pk).with_converted_price('USD').cards().get()
+        self.assertIsInstance(card, ProductCard)
+        self.assertEqual((card.pk, card.name, card.price, card.current_price), (product.pk, 'Ryzen 5', 1000, 900))
+        self.assertEqual(card.category, (self.category.pk, 'Processors', 'processors', self.category.icon))
+        self.assertEqual(card.get_absolute_url(), reverse('store:product_detail', args=[product.slug]))
+        self.assertEqual((card.stock_status, card.is_in_stock), ('Only 3 left', True))
+        self.assertEqual(card.converted_price, Product.objects.with_converted_price('USD').get(pk=product.pk).converted_price)
+        self.assertEqual(card.main_image.url, product.main_image.url)
+        with self.assertRaises(AttributeError):
+            card.description
+
+    def test_cards_load_in_one_query(self):
+        for _ in range(5):
+            self.make_product()
+        with self.assertNumQueries(1):
+            cards = list(Product.objects.cards())
+        self.assertEqual(len({card.category for card in cards}), 1)
+
+    def test_card_templates_render_rows_like_products(self):
+        product = self.make_product(name='Ryzen 5')
+        context = {'secondary_currency': 'USD', 'csrf_token': ''}
+        for variant in ('category', 'list', 'search', 'deal', 'laptop', 'peripheral'):
+            template = f'store/cards/{variant}.html'
+            card = Product.objects.filter(pk=product.pk).with_converted_price('USD').cards().get()
+            model = Product.objects.with_converted_price('USD').get(pk=product.pk)
+            self.assertHTMLEqual(
+                render_to_string(template, dict(context, product=card)),
+                render_to_string(template, dict(context, product=model)),
+            )
+
+
+    @override_settings(DEBUG=True)  # {% csrf_token %} only warns of a missing token in debug
+    def test_benchmark_renders_cards_as_the_cache_does(self):
+        self.make_product()
+        output = StringIO()
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            call_command('benchmark_cards', count=1, repeat=1, stdout=output)
+        self.assertEqual([str(warning.message) for warning in caught], [])
+        self.assertIn('cards()', output.getvalue())
+
+
+class CategoryCounterTests(StoreTestCase):
+    def counters(self, category=None):
+        category = Category.objects.get(pk=(category or self.category).pk)
+        return category.product_count, category.in_stock_count, category.min_price, category.max_price
+
+    def assertCountersRebuilt(self, *categories):
+        """The kept counters equal freshly computed ones"""
+        kept = [self.counters(category) for category in categories]
+        Category.objects.rebuild_product_counters()
+        self.assertEqual(kept, [self.counters(category) for category in categories])
+
+    def test_saves_move_the_counters(self):
+        cheap = self.make_product(price_bdt=Decimal('500'))
+        dear = self.make_product(price_bdt=Decimal('2000'), stock_quantity=0)
+        self.make_product(is_active=False, price_bdt=Decimal('100'))
+        self.assertEqual(self.counters(), (2, 1, Decimal('500'), Decimal('2000')))
+
+        cheap.price_bdt = Decimal('800')
+        cheap.save()
+        self.assertEqual(self.counters(), (2, 1, Decimal('800'), Decimal('2000')))
+
+        other = Category.objects.create(name='Coolers', slug='coolers')
+        dear.category = other
+        dear.save()
+        self.assertEqual(self.counters(), (1, 1, Decimal('800'), Decimal('800')))
+        self.assertEqual(self.counters(other), (1, 0, Decimal('2000'), Decimal('2000')))
+
+        cheap.delete()
+        self.assertEqual(self.counters(), (0, 0, None, None))
+        self.assertCountersRebuilt(self.category, other)
+
+    def test_bulk_updates_rebuild_the_counters(self):
+        products = [self.make_product(price_bdt=Decimal(price)) for price in ('500', '1000', '1500')]
+        other = Category.objects.create(name='Coolers', slug='coolers')
+        Product.objects.filter(pk=products[0].pk).update(stock_quantity=0)
+        Product.objects.filter(pk=products[2].pk).update(category=other)
+        self.assertEqual(self.counters(), (2, 1, Decimal('500'), Decimal('1000')))
+        self.assertEqual(self.counters(other), (1, 1, Decimal('1500'), Decimal('1500')))
+        Product.objects.filter(pk__in=[products[0].pk, products[1].pk]).update(is_available=False)
+        self.assertEqual(self.counters(), (0, 0, None, None))
+        self.assertCountersRebuilt(self.category, other)
+
+    def test_rebuild_command_repairs_drifted_counters(self):
+        self.make_product()
+        Category.objects.update(product_count=7, min_price=None)
+        call_command('rebuild_category_counters', stdout=StringIO())
+        self.assertEqual(self.counters(), (1, 1, Decimal('1000'), Decimal('1000')))
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, sitemaps, views
 
 app_name = 'store'
 
@@ -62,4 +62,39 @@ urlpatterns = [
     
     # Other missing pages
     path('about/', views.about, name='about'),
+
+    # Per-visitor fragments for cached pages
+    path('fragments/', views.session_fragments, name='session_fragments'),
+
+    # JSON API
+    path('api/v1/products/', api.products, name='api_products'),
+    path('api/v1/products/<int:product_id>/', api.product, name='api_product'),
+    path('api/v1/categories/<slug:slug>/products/', api.category_products, name='api_category_products'),
+    path('api/v1/cart/', api.cart, name='api_cart'),
+    path('api/v1/cart/add/', api.cart_add, name='api_cart_add'),
+    path('api/v1/cart/update/', api.cart_update, name='api_cart_update'),
+    path('api/v1/cart/remove/', api.cart_remove, name='api_cart_remove'),
+    path('api/v1/wishlist/', api.wishlist_membership, name='api_wishlist_membership'),
+    path('api/v1/wishlist/add/', api.wishlist_add, name='api_add_to_wishlist'),
+    path('api/v1/wishlist/remove/', api.wishlist_remove, name='api_remove_from_wishlist'),
+    path('api/v1/wishlist/toggle/', api.wishlist_toggle, name='api_toggle_wishlist'),
+    path('api/v1/stock-notifications/', api.request_notification, name='api_request_notification'),
+    path('api/v1/monitoring/rate-limits/', api.rate_limits, name='api_rate_limits'),
+    
+    # Unversioned paths already called by the templates
+    path('api/add-to-cart/', api.cart_add),
+    path('api/wishlist/', api.wishlist_membership),
+    path('api/add-to-wishlist/', api.wishlist_add),
+    path('api/remove-from-wishlist/', api.wishlist_remove),
+    path('api/toggle-wishlist/', api.wishlist_toggle),
+    path('api/request-notification/', api.request_notification),
+
+    # Staff reports
+    path('reports/sales/', views.sales_dashboard, name='sales_dashboard'),
+
+    # Crawlers
+    path('robots.txt', sitemaps.robots_txt, name='robots_txt'),
+    path('sitemap.xml', sitemaps.index, name='sitemap'),
+    path('sitemap-categories.xml', sitemaps.categories, name='sitemap_categories'),
+    path('sitemap-products-<int:number>.xml', sitemaps.products, name='sitemap_products'),
 ]
\ No newline at end of file
@@ -1,18 +1,17 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth import login, authenticate, logout
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q
-import json
 from django.shortcuts import render, get_object_or_404
-from django.core.serializers.json import DjangoJSONEncoder
 from .models import Category, Product
 from django.core.paginator import Paginator
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from .models import (
     Product, Category, Cart, CartItem, Order, OrderItem, 
-    Wishlist, BangladeshLocation, ProductReview
+    Wishlist, BangladeshLocation, ProductReview, ExchangeRate
 )
 from .forms import (
     UserRegistrationForm, UserLoginForm, CheckoutForm,
@@ -24,16 +23,29 @@ from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q
-import json
-from django.core.serializers.json import DjangoJSONEncoder
 from django.core.paginator import Paginator
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_POST, condition
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Max, Prefetch, Sum
+from django.db.models.functions import Cast
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.middleware.csrf import get_token
+from django.views.decorators.cache import never_cache
+
+from .aio import async_condition, gather_queries
+from .cache import get_tracked, get_version, get_versions, set_tracked
+from .cart import VAT_RATE, add_product_to_cart, cart_totals, get_cart, get_cookie_cart
+from .context_processors import get_cart_items_count, get_wishlist_count
+from .search import normalize_filters, search_product_ids
 
 # Import all models - FIX THE IMPORT HERE
 from .models import (
     Category, Product, ProductImage, Review, FAQ,  # Added ProductImage
-    Cart, CartItem, Order, OrderItem, 
+    Cart, CartItem, CustomerSummary, Order, OrderItem, OutboxEmail, SalesRollup, SearchTerm,
     Wishlist, BangladeshLocation, ProductReview
 )
 
@@ -43,40 +55,109 @@ from .forms import (
     BangladeshShippingForm
 )
 
-def home(request):
+async def home(request):
     """Home page view with featured products for Bangladesh market"""
-    featured_products = Product.objects.filter(
-        is_featured=True, 
-        is_available=True
-    )[:8]
-    
-    best_sellers = Product.objects.filter(
-        is_best_seller=True,
-        is_available=True
-    )[:4]
-    
-    new_arrivals = Product.objects.filter(
-        is_new_arrival=True,
-        is_available=True
-    )[:4]
-    
-    categories = Category.objects.all()[:6]
-    
-    context = {
-        'featured_products': featured_products,
-        'best_sellers': best_sellers,
-        'new_arrivals': new_arrivals,
-        'categories': categories,
-        'page_title': 'PC Components & Laptops in Bangladesh | PC Nexus',
-    }
+    context = await gather_queries(
+        featured_products=Product.objects.filter(
+            is_featured=True, 
+            is_available=True
+        )[:8],
+        best_sellers=Product.objects.filter(
+            is_best_seller=True,
+            is_available=True
+        )[:4],
+        new_arrivals=Product.objects.filter(
+            is_new_arrival=True,
+            is_available=True
+        )[:4],
+        categories=Category.objects.all()[:6],
+    )
+    context['page_title'] = 'PC Components & Laptops in Bangladesh | PC Nexus'
     
-    return render(request, 'store/home.html', context)
+    return await sync_to_async(render)(request, 'store/home.html', context)
 
-def product_list(request):
-    """Product listing with filters for Bangladesh market"""
+def _make_etag(*parts):
+    """Hash validator parts into an opaque ETag value"""
+    return hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+def _cached_validators(request, key, compute):
+    """Compute (etag, last_modified) once per request.
+
+    ``condition`` asks for the ETag and Last-Modified separately, so both are
+    derived from the same query and kept on the request.
+
+    Pages rendered for the shared page cache leave the per-visitor parts
+    blank. Any other page shows the visitor's cart and wishlist counts and
+    messages, so its ETag covers the counts and it gets no Last-Modified,
+    and a page with messages waiting is never answered with a 304.
+    """
+    validators = getattr(request, '_validators', None)
+    if validators is None or validators[0] != key:
+        etag, last_modified = compute()
+        if etag is not None:
+            # Prices are shown converted at the rate in effect, which a
+            # scheduled rate changes without a save
+            etag = _make_etag(etag, ExchangeRate.get_rate(settings.STORE_SECONDARY_CURRENCY))
+        if etag is not None and not getattr(request, 'page_cached', False):
+            if len(messages.get_messages(request)):
+                etag = None
+            else:
+                etag = _make_etag(
+                    etag, get_cart_items_count(request), get_wishlist_count(request)
+                )
+            last_modified = None
+        validators = (key, (etag, last_modified))
+        request._validators = validators
+    return validators[1]
+
+def _product_list_validators(request):
+    def compute():
+        stats = _filter_product_list(request).order_by().aggregate(
+            last_modified=Max('updated_at'),
+            count=Count('id'),
+        )
+        etag = _make_etag(
+            'product_list', stats['last_modified'], stats['count'],
+            request.user.pk,
+        )
+        return etag, stats['last_modified']
+    return _cached_validators(request, 'product_list', compute)
+
+def _product_detail_validators(request, slug):
+    def compute():
+        row = Product.objects.filter(slug=slug, is_active=True).values_list(
+            'pk', 'updated_at'
+        ).first()
+        if row is None:
+            return None, None
+        pk, updated_at = row
+        etag = _make_etag(
+            'product', pk, updated_at, get_version('product', pk),
+            get_version('exchange_rates'), request.user.pk,
+        )
+        return etag, updated_at
+    return _cached_validators(request, ('product_detail', slug), compute)
+
+def _category_detail_validators(request, slug):
+    def compute():
+        row = Category.objects.filter(slug=slug).values_list('pk').annotate(
+            last_modified=Max('products__updated_at', filter=Q(products__is_active=True)),
+            count=Count('products', filter=Q(products__is_active=True)),
+        ).first()
+        if row is None:
+            return None, None
+        pk, last_modified, count = row
+        etag = _make_etag(
+            'category', pk, last_modified, count, get_version('category', pk),
+            request.user.pk,
+        )
+        return etag, last_modified
+    return _cached_validators(request, ('category_detail', slug), compute)
+
+def _filter_product_list(request):
+    """Apply the product_list query string filters"""
     products = Product.objects.filter(is_available=True)
     
-    # Apply filters
     category_slug = request.GET.get('category')
     if category_slug:
         products = products.filter(category__slug=category_slug)
@@ -84,9 +165,9 @@ def product_list(request):
     min_price = request.GET.get('min_price')
     max_price = request.GET.get('max_price')
     if min_price:
-        products = products.filter(price_bdt__gte=min_price)
+        products = products.filter(effective_price__gte=min_price)
     if max_price:
-        products = products.filter(price_bdt__lte=max_price)
+        products = products.filter(effective_price__lte=max_price)
     
     brand = request.GET.get('brand')
     if brand:
@@ -102,18 +183,30 @@ def product_list(request):
     elif stock_status == 'low_stock':
         products = products.filter(stock_quantity__gt=0, stock_quantity__lt=10)
     
+    return products
+
+@condition(
+    etag_func=lambda request: _product_list_validators(request)[0],
+    last_modified_func=lambda request: _product_list_validators(request)[1],
+)
+def product_list(request):
+    """Product listing with filters for Bangladesh market"""
+    products = _filter_product_list(request).with_converted_price(
+        settings.STORE_SECONDARY_CURRENCY
+    )
+    
     # Sorting
     sort_by = request.GET.get('sort', '-created_at')
     if sort_by in ['price_low', 'price_high', '-average_rating', '-created_at']:
         if sort_by == 'price_low':
-            products = products.order_by('price_bdt')
+            products = products.order_by('effective_price')
         elif sort_by == 'price_high':
-            products = products.order_by('-price_bdt')
+            products = products.order_by('-effective_price')
         else:
             products = products.order_by(sort_by)
     
     # Pagination
-    paginator = Paginator(products, 12)
+    paginator = Paginator(products.cards(), 12)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
@@ -144,11 +237,6 @@ def product_detail(request, slug):
     
     reviews = product.reviews.all()[:10]
     
-    # Calculate USD price if not set
-    if not product.price_usd:
-        # Approximate conversion rate (adjust as needed)
-        product.price_usd = round(product.price_bdt / 110, 2)
-    
     context = {
         'product': product,
         'related_products': related_products,
@@ -184,6 +272,11 @@ def category_detail(request, slug):
     }
     return render(request, 'store/category_detail.html', context)
 
+def _cart_totals(cart):
+    subtotal = cart.total_price
+    shipping_cost, vat, total = cart_totals(subtotal)
+    return subtotal, shipping_cost, vat, total
+
 @require_POST
 def add_to_cart(request, product_id):
     """Add product to cart"""
@@ -193,28 +286,12 @@ def add_to_cart(request, product_id):
         messages.error(request, 'This product is out of stock.')
         return redirect('store:product_detail', slug=product.slug)
     
-    if request.user.is_authenticated:
-        cart, created = Cart.objects.get_or_create(user=request.user)
-    else:
-        cart_id = request.session.get('cart_id')
-        if cart_id:
-            cart, created = Cart.objects.get_or_create(id=cart_id)
-        else:
-            cart = Cart.objects.create()
-            request.session['cart_id'] = cart.id
-    
     quantity = int(request.POST.get('quantity', 1))
     
-    # Check if item already in cart
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart,
-        product=product,
-        defaults={'quantity': quantity}
-    )
-    
-    if not created:
-        cart_item.quantity += quantity
-        cart_item.save()
+    cart = add_product_to_cart(request, product.id, quantity)
+    if cart is None:
+        messages.error(request, 'Your cart is full. Log in to add more products.')
+        return redirect('store:cart')
     
     messages.success(request, f'{product.name} added to cart.')
     
@@ -230,27 +307,30 @@ def add_to_cart(request, product_id):
 @require_POST
 def remove_from_cart(request, item_id):
     """Remove item from cart"""
-    cart_item = get_object_or_404(CartItem, id=item_id)
-    
     if request.user.is_authenticated:
+        cart_item = get_object_or_404(CartItem.objects.select_related('cart', 'product'), id=item_id)
         if cart_item.cart.user != request.user:
             messages.error(request, 'You do not have permission to modify this cart.')
             return redirect('store:cart')
+        
+        cart = cart_item.cart
+        product_name = cart_item.product.name
+        cart_item.delete()
     else:
-        cart_id = request.session.get('cart_id')
-        if not cart_id or cart_item.cart.id != int(cart_id):
+        cart = get_cookie_cart(request)
+        if item_id not in cart:
             messages.error(request, 'You do not have permission to modify this cart.')
             return redirect('store:cart')
-    
-    product_name = cart_item.product.name
-    cart_item.delete()
+        
+        product_name = Product.objects.filter(id=item_id).values_list('name', flat=True).first()
+        cart.remove(item_id)
     
     messages.success(request, f'{product_name} removed from cart.')
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({
             'success': True,
-            'cart_items_count': cart_item.cart.total_items,
+            'cart_items_count': cart.total_items,
             'message': f'{product_name} removed from cart.'
         })
     
@@ -259,63 +339,53 @@ def remove_from_cart(request, item_id):
 @require_POST
 def update_cart(request, item_id):
     """Update cart item quantity"""
-    cart_item = get_object_or_404(CartItem, id=item_id)
-    
     if request.user.is_authenticated:
+        cart_item = get_object_or_404(CartItem.objects.select_related('cart', 'product'), id=item_id)
         if cart_item.cart.user != request.user:
             return JsonResponse({'success': False, 'error': 'Permission denied'})
+        cart = cart_item.cart
+        product = cart_item.product
     else:
-        cart_id = request.session.get('cart_id')
-        if not cart_id or cart_item.cart.id != int(cart_id):
+        cart = get_cookie_cart(request)
+        if item_id not in cart:
             return JsonResponse({'success': False, 'error': 'Permission denied'})
+        product = get_object_or_404(Product, id=item_id)
     
     quantity = int(request.POST.get('quantity', 1))
     
-    if quantity > cart_item.product.stock_quantity:
+    if quantity > product.stock_quantity:
         return JsonResponse({
             'success': False,
-            'error': f'Only {cart_item.product.stock_quantity} items available.'
+            'error': f'Only {product.stock_quantity} items available.'
         })
     
-    if quantity <= 0:
-        cart_item.delete()
+    if request.user.is_authenticated:
+        if quantity <= 0:
+            cart_item.delete()
+        else:
+            cart_item.quantity = quantity
+            cart_item.save()
     else:
-        cart_item.quantity = quantity
-        cart_item.save()
+        cart.set(product.id, quantity)
     
-    cart = cart_item.cart
+    subtotal, shipping_cost, vat, total = _cart_totals(cart)
     
     return JsonResponse({
         'success': True,
-        'item_total': cart_item.total_price,
-        'subtotal': cart.total_price,
+        'item_total': product.current_price * max(quantity, 0),
+        'subtotal': subtotal,
         'cart_items_count': cart.total_items,
-        'shipping': 120,
-        'vat': (cart.total_price + 120) * 0.15,
-        'total': cart.total_price + 120 + ((cart.total_price + 120) * 0.15)
+        'shipping': shipping_cost,
+        'vat': vat,
+        'total': total,
     })
 
 def cart_view(request):
     """Cart view with Bangladesh shipping calculations"""
-    if request.user.is_authenticated:
-        cart, created = Cart.objects.get_or_create(user=request.user)
-    else:
-        cart_id = request.session.get('cart_id')
-        if cart_id:
-            try:
-                cart = Cart.objects.get(id=cart_id)
-            except Cart.DoesNotExist:
-                cart = Cart.objects.create()
-                request.session['cart_id'] = cart.id
-        else:
-            cart = Cart.objects.create()
-            request.session['cart_id'] = cart.id
+    cart = get_cart(request)
     
     # Calculate totals with VAT for Bangladesh
-    subtotal = cart.total_price
-    shipping_cost = 120  # Default shipping in BDT
-    vat = (subtotal + shipping_cost) * 0.15  # 15% VAT
-    total = subtotal + shipping_cost + vat
+    subtotal, shipping_cost, vat, total = _cart_totals(cart)
     
     context = {
         'cart': cart,
@@ -332,15 +402,8 @@ def cart_view(request):
 @login_required
 def checkout(request):
     """Checkout view with Bangladesh address fields"""
-    if request.user.is_authenticated:
-        cart, created = Cart.objects.get_or_create(user=request.user)
-    else:
-        cart_id = request.session.get('cart_id')
-        if cart_id:
-            cart = get_object_or_404(Cart, id=cart_id)
-        else:
-            messages.error(request, 'Your cart is empty')
-            return redirect('store:cart')
+    # Logging in has already merged the visitor's cookie cart into this one
+    cart, created = Cart.objects.get_or_create(user=request.user)
     
     if cart.total_items == 0:
         messages.error(request, 'Your cart is empty')
@@ -378,7 +441,7 @@ def checkout(request):
             order.total = order.subtotal + order.shipping_cost
             
             # Add VAT for Bangladesh
-            vat = order.total * 0.15
+            vat = order.total * VAT_RATE
             order.total += vat
             
             if request.user.is_authenticated:
@@ -388,26 +451,34 @@ def checkout(request):
             import uuid
             order.order_number = str(uuid.uuid4())[:8].upper()
             
-            order.save()
-            
-            # Create order items
-            for item in cart.items.all():
-                OrderItem.objects.create(
-                    order=order,
-                    product=item.product,
-                    product_name=item.product.name,
-                    quantity=item.quantity,
-                    price=item.product.current_price
+            with transaction.atomic():
+                order.save()
+                
+                # Create order items
+                items = list(cart.items.select_related('product'))
+                order_items = OrderItem.objects.bulk_create([
+                    OrderItem(
+                        order=order,
+                        product=item.product,
+                        product_name=item.product.name,
+                        quantity=item.quantity,
+                        price=item.product.current_price
+                    )
+                    for item in items
+                ])
+                
+                # Clear cart
+                cart.items.all().delete()
+                
+                # Sent later by the send_outbox worker; queued in this
+                # transaction so it exists exactly when the order does
+                OutboxEmail.enqueue(
+                    [order.customer_email],
+                    f'Order #{order.order_number} confirmed | PC Nexus Bangladesh',
+                    'emails/order_confirmation.txt',
+                    {'order': order, 'items': order_items},
                 )
             
-            # Clear cart
-            cart.items.all().delete()
-            
-            # Clear session cart for anonymous users
-            if not request.user.is_authenticated:
-                if 'cart_id' in request.session:
-                    del request.session['cart_id']
-            
             messages.success(request, 'Order placed successfully!')
             return redirect('store:checkout_success', order_number=order.order_number)
     else:
@@ -424,10 +495,7 @@ def checkout(request):
         shipping_form = BangladeshShippingForm()
     
     # Calculate totals for display
-    subtotal = cart.total_price
-    shipping_cost = 120
-    vat = (subtotal + shipping_cost) * 0.15
-    total = subtotal + shipping_cost + vat
+    subtotal, shipping_cost, vat, total = _cart_totals(cart)
     
     context = {
         'form': form,
@@ -484,57 +552,16 @@ def product_search(request):
     return render(request, 'store/product_search.html', context)
 
 # Authentication Views
-def user_login(request):
-    """User login view"""
-    if request.user.is_authenticated:
-        return redirect('store:home')
-    
-    if request.method == 'POST':
-        form = UserLoginForm(request.POST)
-        if form.is_valid():
-            username = form.cleaned_data['username']
-            password = form.cleaned_data['password']
-            user = authenticate(request, username=username, password=password)
-            
-            if user is not None:
-                login(request, user)
-                messages.success(request, 'Login successful!')
-                
-                # Merge anonymous cart with user cart if exists
-                cart_id = request.session.get('cart_id')
-                if cart_id:
-                    try:
-                        anonymous_cart = Cart.objects.get(id=cart_id)
-                        user_cart, created = Cart.objects.get_or_create(user=user)
-                        
-                        for item in anonymous_cart.items.all():
-                            user_item, created = CartItem.objects.get_or_create(
-                                cart=user_cart,
-                                product=item.product,
-                                defaults={'quantity': item.quantity}
-                            )
-                            if not created:
-                                user_item.quantity += item.quantity
-                                user_item.save()
-                        
-                        anonymous_cart.delete()
-                        del request.session['cart_id']
-                    except Cart.DoesNotExist:
-                        pass
-                
-                next_url = request.GET.get('next', 'store:home')
-                return redirect(next_url)
-            else:
-                messages.error(request, 'Invalid username or password.')
-    else:
-        form = UserLoginForm()
-    
-    context = {
-        'form': form,
-        'page_title': 'Login | PC Nexus Bangladesh',
-    }
-    
-    return render(request, 'store/login.html', context)
+def merge_session_cart(request, user):
+    """Fold the visitor's cookie cart into the user's cart after login"""
+    cookie_cart = get_cookie_cart(request)
+    if not cookie_cart.quantities:
+        return
+    
+    with transaction.atomic():
+        user_cart, created = Cart.objects.get_or_create(user=user)
+        user_cart.merge_quantities(cookie_cart.quantities)
+    cookie_cart.clear()
 
 def user_register(request):
     """User registration view"""
@@ -546,6 +573,7 @@ def user_register(request):
         if form.is_valid():
             user = form.save()
             login(request, user)
+            merge_session_cart(request, user)
             messages.success(request, 'Registration successful! Welcome to PC Nexus.')
             
             # Create wishlist for new user
@@ -570,27 +598,56 @@ def user_logout(request):
 
 # Account Views
 @login_required
-def account(request):
+async def account(request):
     """User account dashboard"""
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')[:5]
-    wishlist, created = Wishlist.objects.get_or_create(user=request.user)
+    user = await request.auser()
+    results = await gather_queries(
+        # Order totals come from the summary row, not from the orders table
+        summary=lambda: (
+            CustomerSummary.objects.select_related('last_order').filter(user=user).first()
+            or CustomerSummary(user=user)
+        ),
+        wishlist=lambda: Wishlist.objects.get_or_create(user=user)[0],
+    )
     
     context = {
-        'user': request.user,
-        'orders': orders,
-        'wishlist': wishlist,
+        'user': user,
+        'summary': results['summary'],
+        'wishlist': results['wishlist'],
         'page_title': 'My Account | PC Nexus Bangladesh',
     }
     
-    return render(request, 'store/account.html', context)
+    return await sync_to_async(render)(request, 'store/account.html', context)
+
+ORDERS_PER_PAGE = 10
 
 @login_required
 def order_history(request):
-    """User order history"""
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
+    """User order history, paginated by order id so deep pages stay cheap"""
+    orders = Order.objects.filter(user=request.user).prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+    )
+    
+    before = request.GET.get('before', '')
+    after = request.GET.get('after', '')
+    if after.isdigit():
+        # Walking back towards newer orders: read upwards, then flip
+        page = list(orders.filter(id__gt=after).order_by('id')[:ORDERS_PER_PAGE + 1])
+        has_newer = len(page) > ORDERS_PER_PAGE
+        page = page[:ORDERS_PER_PAGE][::-1]
+        has_older = True
+    else:
+        if before.isdigit():
+            orders = orders.filter(id__lt=before)
+        page = list(orders.order_by('-id')[:ORDERS_PER_PAGE + 1])
+        has_older = len(page) > ORDERS_PER_PAGE
+        page = page[:ORDERS_PER_PAGE]
+        has_newer = before.isdigit()
     
     context = {
-        'orders': orders,
+        'orders': page,
+        'older_cursor': page[-1].id if page and has_older else None,
+        'newer_cursor': page[0].id if page and has_newer else None,
         'page_title': 'Order History | PC Nexus Bangladesh',
     }
     
@@ -626,11 +683,11 @@ def wishlist_view(request):
 def add_to_wishlist(request, product_id):
     """Add product to wishlist"""
     product = get_object_or_404(Product, id=product_id)
-    wishlist, created = Wishlist.objects.get_or_create(user=request.user)
     
-    if wishlist.products.filter(id=product.id).exists():
+    if product.id in Wishlist.get_product_ids(request.user):
         messages.info(request, 'This product is already in your wishlist.')
     else:
+        wishlist, created = Wishlist.objects.get_or_create(user=request.user)
         wishlist.products.add(product)
         messages.success(request, f'{product.name} added to wishlist.')
     
@@ -643,7 +700,7 @@ def remove_from_wishlist(request, product_id):
     product = get_object_or_404(Product, id=product_id)
     wishlist = get_object_or_404(Wishlist, user=request.user)
     
-    if wishlist.products.filter(id=product.id).exists():
+    if product.id in Wishlist.get_product_ids(request.user):
         wishlist.products.remove(product)
         messages.success(request, f'{product.name} removed from wishlist.')
     
@@ -693,7 +750,7 @@ def peripherals(request):
         defaults={'slug': 'peripherals', 'icon': 'fas fa-keyboard', 'description': 'Keyboards, mice, monitors, and other peripherals'}
     )
     
-    peripherals = Product.objects.filter(category=peripherals_category, is_available=True)
+    peripherals = Product.objects.filter(category=peripherals_category, is_available=True).cards()
     
     context = {
         'peripherals': peripherals,
@@ -837,26 +894,7 @@ def user_login(request):
                 messages.success(request, 'Login successful!')
                 
                 # Merge anonymous cart with user cart if exists
-                cart_id = request.session.get('cart_id')
-                if cart_id:
-                    try:
-                        anonymous_cart = Cart.objects.get(id=cart_id)
-                        user_cart, created = Cart.objects.get_or_create(user=user)
-                        
-                        for item in anonymous_cart.items.all():
-                            user_item, created = CartItem.objects.get_or_create(
-                                cart=user_cart,
-                                product=item.product,
-                                defaults={'quantity': item.quantity}
-                            )
-                            if not created:
-                                user_item.quantity += item.quantity
-                                user_item.save()
-                        
-                        anonymous_cart.delete()
-                        del request.session['cart_id']
-                    except Cart.DoesNotExist:
-                        pass
+                merge_session_cart(request, user)
                 
                 next_url = request.GET.get('next', 'store:home')
                 return redirect(next_url)
@@ -875,50 +913,24 @@ def user_login(request):
 def product_search(request):
     """Search products for Bangladesh market"""
     query = request.GET.get('q', '')
+    filters = normalize_filters(request.GET)
     
-    if query:
-        products = Product.objects.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(brand__icontains=query) |
-            Q(model__icontains=query),
-            is_available=True
-        )
-    else:
-        products = Product.objects.filter(is_available=True)
-    
-    # Apply filters from request
-    min_price = request.GET.get('min_price')
-    max_price = request.GET.get('max_price')
-    category_slug = request.GET.get('category')
-    stock_status = request.GET.get('stock')
-    sort_by = request.GET.get('sort', '-created_at')
-    
-    if min_price:
-        products = products.filter(price_bdt__gte=min_price)
-    if max_price:
-        products = products.filter(price_bdt__lte=max_price)
-    
-    if category_slug:
-        products = products.filter(category__slug=category_slug)
-    
-    if stock_status == 'in_stock':
-        products = products.filter(stock_quantity__gt=0)
-    elif stock_status == 'low_stock':
-        products = products.filter(stock_quantity__gt=0, stock_quantity__lt=10)
-    
-    # Sorting
-    if sort_by == 'price_low':
-        products = products.order_by('price_bdt')
-    elif sort_by == 'price_high':
-        products = products.order_by('-price_bdt')
-    else:
-        products = products.order_by(sort_by)
+    # Result ids are cached per normalized query, so spelling variants of a
+    # popular search share one entry; only the shown page is loaded
+    product_ids, fuzzy = search_product_ids(filters)
+    if filters['q'] and not request.GET.get('page'):
+        SearchTerm.record(filters['q'])
     
     # Pagination
-    paginator = Paginator(products, 12)
+    paginator = Paginator(product_ids, 12)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    products = {
+        product.pk: product for product in Product.objects.filter(
+            pk__in=page_obj.object_list
+        ).with_converted_price(settings.STORE_SECONDARY_CURRENCY).cards()
+    }
+    page_obj.object_list = [products[pk] for pk in page_obj.object_list if pk in products]
     
     # Get categories for filter
     categories = Category.objects.all()
@@ -927,7 +939,8 @@ def product_search(request):
         'products': page_obj,
         'categories': categories,
         'query': query,
-        'total_results': products.count(),
+        'fuzzy': fuzzy,
+        'total_results': paginator.count,
         'page_title': f'Search: {query} | PC Nexus Bangladesh',
     }
     
@@ -946,7 +959,9 @@ def laptops(request):
     )
     
     # Get laptops
-    laptops = Product.objects.filter(category=laptop_category, is_available=True)
+    laptops = Product.objects.filter(
+        category=laptop_category, is_available=True
+    ).with_converted_price(settings.STORE_SECONDARY_CURRENCY)
     
     # Apply filters
     brand = request.GET.get('brand')
@@ -956,9 +971,9 @@ def laptops(request):
     min_price = request.GET.get('min_price')
     max_price = request.GET.get('max_price')
     if min_price:
-        laptops = laptops.filter(price_bdt__gte=min_price)
+        laptops = laptops.filter(effective_price__gte=min_price)
     if max_price:
-        laptops = laptops.filter(price_bdt__lte=max_price)
+        laptops = laptops.filter(effective_price__lte=max_price)
     
     stock_status = request.GET.get('stock')
     if stock_status == 'in_stock':
@@ -970,12 +985,14 @@ def laptops(request):
     sort_by = request.GET.get('sort', '-created_at')
     if sort_by in ['price_low', 'price_high', '-average_rating', '-created_at']:
         if sort_by == 'price_low':
-            laptops = laptops.order_by('price_bdt')
+            laptops = laptops.order_by('effective_price')
         elif sort_by == 'price_high':
-            laptops = laptops.order_by('-price_bdt')
+            laptops = laptops.order_by('-effective_price')
         else:
             laptops = laptops.order_by(sort_by)
     
+    laptops = laptops.cards()
+    
     context = {
         'laptops': laptops,
         'category': laptop_category,
@@ -992,70 +1009,138 @@ def pc_builder(request):
     return render(request, 'store/pc_builder.html', context)
 
 
+@condition(
+    etag_func=lambda request, slug: _category_detail_validators(request, slug)[0],
+    last_modified_func=lambda request, slug: _category_detail_validators(request, slug)[1],
+)
 def category_detail(request, slug):
     category = get_object_or_404(Category, slug=slug)
-    products = Product.objects.filter(category=category, is_active=True)
-    
-    # Convert products to JSON for JavaScript
-    products_json = json.dumps(list(products.values(
-        'id', 'name', 'slug', 'price', 'old_price', 'brand', 
-        'stock', 'rating', 'review_count', 'short_description',
-        'image_url'  # Make sure this field exists or adjust accordingly
-    )), cls=DjangoJSONEncoder)
+    if getattr(request, 'page_cached', False):
+        request.cache_dependencies.append(('category', category.pk))
+    products = Product.objects.filter(
+        category=category, is_active=True
+    ).with_converted_price(settings.STORE_SECONDARY_CURRENCY).cards()
+
+    # Pagination
+    paginator = Paginator(products, 12)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
     
     context = {
         'category': category,
-        'products': products,
-        'products_json': products_json,
-        'title': category.name,
+        'products': page_obj,
+        'page_title': f'{category.name} in Bangladesh | PC Nexus',
     }
-    return render(request, 'store/category.html', context)
+    return render(request, 'store/category_detail.html', context)
 
 from django.shortcuts import render, get_object_or_404
 from django.db.models import Q
 from .models import Product, ProductImage, Review, FAQ
-import json
 
-def product_detail(request, slug):
-    product = get_object_or_404(Product, slug=slug, is_active=True)
+def record_recently_viewed(request, product_id):
+    """Move a product to the front of the session's recently viewed list"""
+    recently_viewed = request.session.get('recently_viewed', [])
     
-    # Get product images
-    product_images = ProductImage.objects.filter(product=product)
+    # Remove if already exists and add to beginning
+    if product_id in recently_viewed:
+        recently_viewed.remove(product_id)
+    recently_viewed.insert(0, product_id)
     
-    # Get related products (same category, exclude current)
-    related_products = Product.objects.filter(
-        category=product.category,
+    # Keep only last 10 products
+    request.session['recently_viewed'] = recently_viewed[:10]
+    request.session.modified = True
+
+def _related_products(product, limit=6):
+    """Frequently bought together products, or same-category ones until
+    update_recommendations has seen orders for this product"""
+    related = list(Product.objects.filter(
+        recommended_with__product=product,
         is_active=True
-    ).exclude(id=product.id)[:6]
-    
-    # Get product reviews
-    reviews = Review.objects.filter(product=product, is_approved=True)[:10]
-    
-    # Get FAQs for this product category
-    faqs = FAQ.objects.filter(
-        Q(product=product) | Q(category=product.category)
-    )[:10]
-    
-    # Get recently viewed products from session
-    recently_viewed = request.session.get('recently_viewed', [])
-    recently_viewed_products = Product.objects.filter(
-        id__in=recently_viewed[:4],
+    ).order_by('recommended_with__rank')[:limit])
+    if related:
+        return related
+    return list(Product.objects.filter(
+        category=product.category,
         is_active=True
-    ).exclude(id=product.id)
+    ).exclude(id=product.id)[:limit])
+
+PRODUCT_DETAIL_TIMEOUT = 60 * 60  # Seconds; changes are tracked, this only bounds races
+
+async def _product_detail_bundle(slug):
+    """The visitor-independent data of a product page.
+
+    Cached per product and currency until the product (which its images,
+    reviews, FAQs and recommendations move too), its category (for its
+    FAQs and same-category products), a recommended product's category or
+    the exchange rates change. Returns None for a missing product.
+    """
+    currency = settings.STORE_SECONDARY_CURRENCY
+    # Looking up the exchange rate may query the database. The rate in
+    # effect is part of the key, as a scheduled rate takes effect unsaved
+    rate = await sync_to_async(ExchangeRate.get_rate)(currency)
+    key = f'product_detail:{slug}:{currency}:{rate}'
+    bundle = await sync_to_async(get_tracked)(key)
+    if bundle is not None:
+        return bundle
+    
+    products = await sync_to_async(Product.objects.with_converted_price)(currency)
+    product = await products.select_related('category').filter(
+        slug=slug, is_active=True
+    ).afirst()
+    if product is None:
+        return None
+    dependencies = [('product', product.pk), ('category', product.category_id), ('exchange_rates',)]
+    versions = await sync_to_async(get_versions)(dependencies)
+    
+    # The remaining queries are independent of each other
+    results = await gather_queries(
+        product_images=lambda: list(ProductImage.objects.filter(product=product)),
+        related_products=lambda: _related_products(product),
+        reviews=lambda: list(Review.objects.filter(
+            product=product, is_approved=True
+        ).select_related('user')[:10]),
+        faqs=lambda: list(FAQ.objects.filter(
+            Q(product=product) | Q(category=product.category)
+        )[:10]),
+    )
     
-    # Add current product to recently viewed
-    if 'recently_viewed' not in request.session:
-        request.session['recently_viewed'] = []
+    # Recommendations from other categories are not covered by the product's
+    # category version but by theirs, which bulk updates move as well
+    recommended = list(dict.fromkeys(
+        ('category', related.category_id) for related in results['related_products']
+        if related.category_id != product.category_id
+    ))
+    if recommended:
+        dependencies += recommended
+        versions += await sync_to_async(get_versions)(recommended)
+    bundle = dict(results, product=product, dependencies=dependencies)
+    await sync_to_async(set_tracked)(key, bundle, dependencies, versions, PRODUCT_DETAIL_TIMEOUT)
+    return bundle
+
+@async_condition(_product_detail_validators)
+async def product_detail(request, slug):
+    bundle = await _product_detail_bundle(slug)
+    if bundle is None:
+        raise Http404('No Product matches the given query.')
+    product = bundle['product']
+    page_cached = getattr(request, 'page_cached', False)
+    
+    # Pages rendered for the shared page cache record the view through
+    # session_fragments instead of reading the session here
+    if page_cached:
+        request.cache_dependencies.extend(bundle['dependencies'])
+        recently_viewed = []
+    else:
+        recently_viewed = await request.session.aget('recently_viewed', [])
+        recently_viewed = [pk for pk in recently_viewed if pk != product.pk][:4]
     
-    # Remove if already exists and add to beginning
-    if product.id in request.session['recently_viewed']:
-        request.session['recently_viewed'].remove(product.id)
+    if recently_viewed:
+        recently_viewed = [
+            viewed async for viewed in Product.objects.filter(id__in=recently_viewed, is_active=True)
+        ]
     
-    request.session['recently_viewed'].insert(0, product.id)
-    
-    # Keep only last 10 products
-    request.session['recently_viewed'] = request.session['recently_viewed'][:10]
-    request.session.modified = True
+    if not page_cached:
+        await sync_to_async(record_recently_viewed)(request, product.id)
     
     # Calculate discount if old price exists
     if product.old_price and product.old_price > product.price:
@@ -1067,11 +1152,11 @@ def product_detail(request, slug):
     
     context = {
         'product': product,
-        'product_images': product_images,
-        'related_products': related_products,
-        'reviews': reviews,
-        'faqs': faqs,
-        'recently_viewed': recently_viewed_products,
+        'product_images': bundle['product_images'],
+        'related_products': bundle['related_products'],
+        'reviews': bundle['reviews'],
+        'faqs': bundle['faqs'],
+        'recently_viewed': recently_viewed,
         'discount_amount': discount_amount,
         'discount_percentage': discount_percentage,
         'save_amount': discount_amount,
@@ -1079,7 +1164,7 @@ def product_detail(request, slug):
         'title': f"{product.name} - ৳{product.price}",
     }
     
-    return render(request, 'store/product_details.html', context)
+    return await sync_to_async(render)(request, 'store/product_detail.html', context)
 
 def user_logout(request):
     """User logout view"""
@@ -1225,14 +1310,27 @@ def support(request):
     return render(request, 'store/support.html', context)
 
 def deals(request):
-    """Deals and offers page"""
+    """Deals and offers page, biggest discounts first"""
+    # effective_price already includes running flash sales
     discounted_products = Product.objects.filter(
-        discount_percentage__gt=0,
+        effective_price__lt=F('price_bdt'),
         is_available=True
-    )
+    ).annotate(
+        # Cast first, or SQLite divides whole prices as integers
+        price_ratio=ExpressionWrapper(
+            Cast('effective_price', FloatField()) / Cast('price_bdt', FloatField()),
+            output_field=FloatField(),
+        ),
+        saving=F('price_bdt') - F('effective_price'),
+    ).order_by('price_ratio', '-created_at').cards()
+    
+    # Pagination
+    paginator = Paginator(discounted_products, 24)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
     
     context = {
-        'discounted_products': discounted_products,
+        'discounted_products': page_obj,
         'page_title': 'Deals & Offers | PC Nexus Bangladesh',
     }
     return render(request, 'store/deals.html', context)
@@ -1245,4 +1343,64 @@ def newsletter_subscribe(request):
         # For now, just show success message
         messages.success(request, 'Thank you for subscribing to our newsletter!')
     
-    return redirect('store:home')
\ No newline at end of file
+    return redirect('store:home')
+
+@never_cache
+def session_fragments(request):
+    """Per-visitor parts of pages served from the anonymous page cache"""
+    viewed = request.GET.get('viewed')
+    if viewed and viewed.isdigit():
+        record_recently_viewed(request, int(viewed))
+    
+    return JsonResponse({
+        'cart_items_count': get_cart_items_count(request),
+        'wishlist_count': get_wishlist_count(request),
+        'messages': [
+            {'tags': message.tags, 'message': str(message)}
+            for message in messages.get_messages(request)
+        ],
+        'csrf_token': get_token(request),
+    })
+
+# Reporting
+DASHBOARD_PERIODS = {'day': 30, 'week': 12, 'month': 12}  # Periods shown per grain
+
+@staff_member_required
+def sales_dashboard(request):
+    """Sales report for staff, read from the rollup tables only"""
+    period = request.GET.get('period', 'day')
+    if period not in DASHBOARD_PERIODS:
+        period = 'day'
+    
+    rollups = SalesRollup.objects.filter(period=period)
+    periods = list(
+        rollups.filter(dimension='total').order_by('-period_start')[:DASHBOARD_PERIODS[period]]
+    )
+    
+    breakdowns = {}
+    if periods:
+        in_range = rollups.filter(period_start__gte=periods[-1].period_start).exclude(dimension='total')
+        labels = {
+            'payment_method': dict(Order.PAYMENT_METHODS),
+            'status': dict(Order.STATUS_CHOICES),
+        }
+        for dimension, title in SalesRollup.DIMENSIONS[1:]:
+            rows = list(in_range.filter(dimension=dimension).values('key').annotate(
+                order_count=Sum('order_count'), units=Sum('units'), revenue=Sum('revenue'),
+            ).order_by('-revenue')[:10])
+            if dimension == 'product':
+                labels[dimension] = Product.objects.in_bulk([int(row['key']) for row in rows])
+            elif dimension == 'category':
+                labels[dimension] = Category.objects.in_bulk([int(row['key']) for row in rows])
+            for row in rows:
+                key = int(row['key']) if dimension in ('product', 'category') else row['key']
+                row['label'] = labels.get(dimension, {}).get(key, row['key'])
+            breakdowns[title] = rows
+    
+    context = {
+        'period': period,
+        'periods': periods,
+        'breakdowns': breakdowns,
+        'page_title': 'Sales Dashboard | PC Nexus Bangladesh',
+    }
+    return render(request, 'store/sales_dashboard.html', context)